@@ -1,22 +1,164 @@
 # backend/agents/base_agent.py
 from abc import ABC, abstractmethod
 import google.generativeai as genai
-from typing import Dict, Any, List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable, Tuple
+import asyncio
+import contextvars
+import functools
 import json
+import os
+import re
+import time
+from .prompts import PromptContext
+from tracing.recorder import get_tracer
+
+# Model calls block a thread for the whole round trip. They get their own pool, sized
+# for every admitted run having all four agents in flight, so they neither queue behind
+# nor starve other to_thread work (index updates, uploads) on the default executor.
+MODEL_THREADS = int(os.getenv("AGENTFORGE_MODEL_THREADS", str(int(os.getenv("AGENTFORGE_MAX_IN_FLIGHT", "8")) * 4)))
+model_executor = ThreadPoolExecutor(max_workers=MODEL_THREADS, thread_name_prefix="agentforge-model")
+
+async def run_model_call(fn: Callable, *args):
+    """Run a blocking SDK call on the model executor, keeping the caller's context (trace run)"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(model_executor, functools.partial(context.run, fn, *args))
+
+# Interactions each agent keeps; agents live for the whole process and see every request
+AGENT_MEMORY_SIZE = int(os.getenv("AGENTFORGE_AGENT_MEMORY", "20"))
+
+def extract_string_field(text: str, field: str) -> Optional[str]:
+    """Value of a top-level JSON string field in a partial reply, or None until its closing quote arrives"""
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(field), text)
+    if not match:
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, match.end() - 1)
+    except ValueError:
+        return None
+    return value if isinstance(value, str) else None
 
 class BaseAgent(ABC):
-    def __init__(self, name: str, role: str, model):
+    # Keys the model's JSON must contain for the response to count as valid
+    required_keys: List[str] = []
+
+    def __init__(self, name: str, role: str, model, router=None):
         self.name = name
         self.role = role
         self.model = model
-        self.memory = []
+        self.router = router
+        self.memory = deque(maxlen=AGENT_MEMORY_SIZE)
 
     @abstractmethod
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         pass
 
+    def parse_response(self, text: str) -> Dict[str, Any]:
+        """Parse the model's JSON reply, tolerating markdown code fences"""
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.split("\n", 1)[1] if "\n" in text else ""
+            text = text.rsplit("```", 1)[0]
+        result = json.loads(text)
+        if not isinstance(result, dict):
+            raise ValueError(f"{self.name} returned {type(result).__name__}, expected an object")
+        missing = [key for key in self.required_keys if key not in result]
+        if missing:
+            raise ValueError(f"{self.name} response is missing {', '.join(missing)}")
+        return result
+
+    async def generate(self, context: PromptContext, suffix: str, input_data: Dict[str, Any],
+                       tier: Optional[str] = None) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Call the routed model, escalating to a stronger tier when the reply fails to parse or validate.
+
+        Returns (result, name of the model that produced it). Agents are
+        shared by concurrent runs, so the model is returned, not stored.
+        """
+        if self.router is None:
+            model_name = getattr(self.model, "model_name", None)
+            model, prompt = await context.resolve(model_name, self.model, suffix)
+            response = await self._call_model(model, model_name, prompt)
+            return self.parse_response(response.text), model_name
+
+        tier = tier or self.router.route(self.name.lower(), input_data)
+        while True:
+            model_name = self.router.model_name(tier)
+            model, prompt = await context.resolve(model_name, self.router.get_model(tier), suffix)
+            response = await self._call_model(model, model_name, prompt)
+            try:
+                return self.parse_response(response.text), model_name
+            except ValueError:
+                tier = self.router.escalate(tier)
+                if tier is None:
+                    raise
+
+    async def generate_streaming(self, context: PromptContext, suffix: str, input_data: Dict[str, Any],
+                                 field: str, on_field: Callable[[str], None]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Stream the reply and call on_field(value) as soon as the given string field is complete.
+
+        Used for speculative pipelining: downstream agents can start on the
+        field before the rest of the JSON has been generated.
+        """
+        if self.router is None:
+            tier = None
+            model_name = getattr(self.model, "model_name", None)
+            base_model = self.model
+        else:
+            tier = self.router.route(self.name.lower(), input_data)
+            model_name = self.router.model_name(tier)
+            base_model = self.router.get_model(tier)
+        model, prompt = await context.resolve(model_name, base_model, suffix)
+        loop = asyncio.get_running_loop()
+
+        def consume() -> str:
+            text = ""
+            notified = False
+            started = time.perf_counter()
+            try:
+                for chunk in model.generate_content(prompt, stream=True):
+                    text += chunk.text
+                    if not notified:
+                        value = extract_string_field(text, field)
+                        if value is not None:
+                            loop.call_soon_threadsafe(on_field, value)
+                            notified = True
+            except Exception as e:
+                self._trace(model_name, prompt, None, time.perf_counter() - started, repr(e), stream=True)
+                raise
+            self._trace(model_name, prompt, text, time.perf_counter() - started, stream=True)
+            return text
+
+        text = await run_model_call(consume)
+        try:
+            return self.parse_response(text), model_name
+        except ValueError:
+            if tier is None or self.router.escalate(tier) is None:
+                raise
+            return await self.generate(context, suffix, input_data, self.router.escalate(tier))
+
+    async def _call_model(self, model, model_name: Optional[str], prompt: str):
+        # The SDK call blocks; run it in a thread so other agents and requests keep going
+        started = time.perf_counter()
+        try:
+            response = await run_model_call(model.generate_content, prompt)
+        except Exception as e:
+            self._trace(model_name, prompt, None, time.perf_counter() - started, repr(e))
+            raise
+        self._trace(model_name, prompt, response.text, time.perf_counter() - started)
+        return response
+
+    def _trace(self, model_name: Optional[str], prompt: str, response: Optional[str], latency: float,
+               error: Optional[str] = None, stream: bool = False):
+        tracer = get_tracer()
+        if tracer is not None:
+            tracer.record_model_call(self.name.lower(), model_name, prompt, response, latency, error, stream)
+
     def add_to_memory(self, data: Dict[str, Any]):
+        if "context" in data.get("input", {}):
+            # The shared prompt context is per-request plumbing, not history
+            data["input"] = {k: v for k, v in data["input"].items() if k != "context"}
         self.memory.append(data)
 
     def get_memory_context(self) -> str:
-        return json.dumps(self.memory[-5:])  # Last 5 interactions
\ No newline at end of file
+        return json.dumps(list(self.memory)[-5:])  # Last 5 interactions
\ No newline at end of file
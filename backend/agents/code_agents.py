@@ -1,22 +1,21 @@
 from .base_agent import BaseAgent
+from .prompts import get_prompt_context
 import google.generativeai as genai
-from typing import Dict, Any, List
-import json
+from typing import Dict, Any, List, Optional, Callable
 
 class ArchitectAgent(BaseAgent):
-    def __init__(self, model):
-        super().__init__("Architect", "Code Architecture Designer", model)
+    required_keys = ["analysis", "improvements"]
+    
+    def __init__(self, model, router=None):
+        super().__init__("Architect", "Code Architecture Designer", model, router)
         
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        code = input_data.get("code", "")
+        context = get_prompt_context(input_data)
         requirements = input_data.get("requirements", "")
         
         prompt = f"""
         You are a Senior Software Architect. Analyze this code and provide specific architectural improvements with Big O notation analysis.
         
-        Code:
-        {code}
-        
         Requirements:
         {requirements}
         
@@ -45,31 +44,31 @@ class ArchitectAgent(BaseAgent):
         Keep responses concise and actionable with specific Big O notation.
         """
         
-        response = self.model.generate_content(prompt)
-        result = json.loads(response.text)
+        result, model_name = await self.generate(context, prompt, input_data)
         
         self.add_to_memory({
             "input": input_data,
             "output": result,
+            "model": model_name,
             "timestamp": "2025-01-20T10:00:00Z"
         })
         
         return result
 
 class ImplementationAgent(BaseAgent):
-    def __init__(self, model):
-        super().__init__("Implementer", "Code Implementation Specialist", model)
-        
-    async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        code = input_data.get("code", "")
+    required_keys = ["improved_code"]
+    
+    def __init__(self, model, router=None):
+        super().__init__("Implementer", "Code Implementation Specialist", model, router)
+        
+    async def process(self, input_data: Dict[str, Any], on_code: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """on_code, when given, is called with improved_code as soon as it has been streamed"""
+        context = get_prompt_context(input_data)
         suggestions = input_data.get("suggestions", "")
         
         prompt = f"""
         You are a Senior Software Developer. Implement optimized improvements to this code with better time/space complexity.
         
-        Original Code:
-        {code}
-        
         Suggested Improvements:
         {suggestions}
         
@@ -99,30 +98,33 @@ class ImplementationAgent(BaseAgent):
         Keep the improved code concise, practical, and well-documented.
         """
         
-        response = self.model.generate_content(prompt)
-        result = json.loads(response.text)
+        if on_code is None:
+            result, model_name = await self.generate(context, prompt, input_data)
+        else:
+            result, model_name = await self.generate_streaming(context, prompt, input_data, "improved_code", on_code)
         
         self.add_to_memory({
             "input": input_data,
             "output": result,
+            "model": model_name,
             "timestamp": "2025-01-20T10:00:00Z"
         })
         
         return result
 
 class TestingAgent(BaseAgent):
-    def __init__(self, model):
-        super().__init__("Tester", "Quality Assurance Specialist", model)
+    required_keys = ["unit_tests"]
+    
+    def __init__(self, model, router=None):
+        super().__init__("Tester", "Quality Assurance Specialist", model, router)
         
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         code = input_data.get("code", "")
+        context = get_prompt_context(input_data, code)
         
-        prompt = f"""
+        prompt = """
         You are a Senior QA Engineer. Create comprehensive tests for this code and verify complexity analysis.
         
-        Code:
-        {code}
-        
         Provide essential tests:
         1. Unit tests for main functions with edge cases
         2. Integration tests for component interactions
@@ -146,30 +148,30 @@ class TestingAgent(BaseAgent):
         Keep tests concise, practical, and focused on verifying the code's correctness and performance.
         """
         
-        response = self.model.generate_content(prompt)
-        result = json.loads(response.text)
+        result, model_name = await self.generate(context, prompt, input_data)
         
         self.add_to_memory({
             "input": input_data,
             "output": result,
+            "model": model_name,
             "timestamp": "2025-01-20T10:00:00Z"
         })
         
         return result
 
 class SecurityAgent(BaseAgent):
-    def __init__(self, model):
-        super().__init__("Security", "Security Auditor", model)
+    required_keys = ["vulnerabilities"]
+    
+    def __init__(self, model, router=None):
+        super().__init__("Security", "Security Auditor", model, router)
         
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         code = input_data.get("code", "")
+        context = get_prompt_context(input_data, code)
         
-        prompt = f"""
+        prompt = """
         You are a Senior Security Engineer. Audit this code for security vulnerabilities and provide comprehensive security analysis.
         
-        Code:
-        {code}
-        
         Provide comprehensive security analysis:
         1. Input validation and sanitization issues
         2. Data exposure and privacy risks
@@ -196,12 +198,12 @@ class SecurityAgent(BaseAgent):
         Keep analysis concise, actionable, and focused on practical security improvements.
         """
         
-        response = self.model.generate_content(prompt)
-        result = json.loads(response.text)
+        result, model_name = await self.generate(context, prompt, input_data)
         
         self.add_to_memory({
             "input": input_data,
             "output": result,
+            "model": model_name,
             "timestamp": "2025-01-20T10:00:00Z"
         })
         
@@ -0,0 +1,68 @@
+# backend/agents/model_router.py
+import os
+from typing import Dict, Any, Optional
+import google.generativeai as genai
+
+# Tiers from cheapest to strongest; escalation walks this list upwards
+TIERS = ["small", "default", "large"]
+
+DEFAULT_TIER_MODELS = {
+    "small": "gemini-2.5-flash-lite",
+    "default": "gemini-2.5-flash",
+    "large": "gemini-2.5-pro",
+}
+
+# Per-agent routing: inputs at or below both thresholds use `short`, anything bigger uses `long`
+DEFAULT_AGENT_POLICIES = {
+    "architect": {"short": "small", "long": "default", "max_lines": 80, "max_complexity": 10},
+    "implementer": {"short": "default", "long": "large", "max_lines": 300, "max_complexity": 25},
+    "tester": {"short": "small", "long": "default", "max_lines": 120, "max_complexity": 15},
+    "security": {"short": "small", "long": "default", "max_lines": 200, "max_complexity": 30},
+}
+
+class ModelRouter:
+    """Chooses a Gemini model per agent call from the input size and complexity"""
+
+    def __init__(self, tier_models: Optional[Dict[str, str]] = None, policies: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.tier_models = dict(DEFAULT_TIER_MODELS)
+        for tier in TIERS:
+            override = os.getenv(f"AGENTFORGE_MODEL_{tier.upper()}")
+            if override:
+                self.tier_models[tier] = override
+        self.tier_models.update(tier_models or {})
+
+        self.policies = {agent: dict(policy) for agent, policy in DEFAULT_AGENT_POLICIES.items()}
+        for agent, policy in (policies or {}).items():
+            self.policies.setdefault(agent, {}).update(policy)
+
+        self._models = {}
+
+    def route(self, agent: str, input_data: Dict[str, Any]) -> str:
+        """Pick the starting tier for an agent call"""
+        # AGENTFORGE_<AGENT>_TIER pins an agent to one tier regardless of input
+        pinned = os.getenv(f"AGENTFORGE_{agent.upper()}_TIER")
+        if pinned in TIERS:
+            return pinned
+
+        policy = self.policies.get(agent)
+        if not policy:
+            return "default"
+        lines = input_data.get("code", "").count("\n") + 1
+        complexity = input_data.get("complexity", 0) or 0
+        if lines <= policy["max_lines"] and complexity <= policy["max_complexity"]:
+            return policy["short"]
+        return policy["long"]
+
+    def escalate(self, tier: str) -> Optional[str]:
+        """Next stronger tier, or None when already at the top"""
+        index = TIERS.index(tier)
+        return TIERS[index + 1] if index + 1 < len(TIERS) else None
+
+    def model_name(self, tier: str) -> str:
+        return self.tier_models[tier]
+
+    def get_model(self, tier: str):
+        name = self.model_name(tier)
+        if name not in self._models:
+            self._models[name] = genai.GenerativeModel(name)
+        return self._models[name]
@@ -0,0 +1,146 @@
+# backend/agents/prompts.py
+import asyncio
+import datetime
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import google.generativeai as genai
+
+try:
+    from google.generativeai import caching
+except ImportError:  # context caching needs a newer google-generativeai
+    caching = None
+
+SHARED_INSTRUCTIONS = """You are one member of AgentForge, a team of senior engineers (architect, implementer,
+tester, security auditor) reviewing the same code. Each member receives this code once and then a
+task of their own. Always answer with a single JSON object using exactly the keys your task asks
+for, with no prose outside the JSON. Be concise, specific and use Big O notation where relevant."""
+
+# Gemini refuses to cache small contexts; below this estimate we send the prefix inline
+CACHE_MIN_TOKENS = int(os.getenv("AGENTFORGE_CACHE_MIN_TOKENS", "4096"))
+CACHE_TTL_SECONDS = int(os.getenv("AGENTFORGE_CACHE_TTL_SECONDS", "600"))
+CONTEXT_CACHING = os.getenv("AGENTFORGE_CONTEXT_CACHING", "true").lower() == "true"
+
+# (model name, prefix digest) -> (cached model, expiry); shared across requests so a session reuses uploads
+_context_cache: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+# Uploads in progress, so agents that need the same prefix at once wait for one upload
+_pending_uploads: Dict[Tuple[str, str], "asyncio.Future"] = {}
+
+def _format_facts(facts: str) -> str:
+    if not facts:
+        return ""
+    return f"\n\nStatic analysis facts (computed locally, do not re-derive):\n{facts}"
+
+class PromptContext:
+    """Shared prompt prefix (instructions + code + facts) built once per request"""
+
+    def __init__(self, code: str, facts: str = ""):
+        self.code = code
+        self.prefix = f"{SHARED_INSTRUCTIONS}\n\nCode:\n{code}{_format_facts(facts)}\n"
+        self.digest = hashlib.sha256(self.prefix.encode()).hexdigest()
+
+    def compile(self, suffix: str) -> str:
+        return f"{self.prefix}\n{suffix}"
+
+    def review(self, code: Optional[str]) -> "PromptContext":
+        """Context for an agent that works on a different version of the code than the prefix holds"""
+        if not code or code == self.code:
+            return self
+        return ReviewContext(self, code)
+
+    async def resolve(self, model_name: str, model, suffix: str):
+        """Return (model, prompt): a cached-context model with just the suffix when possible, else the full prompt"""
+        # Only real SDK models can use provider caching (not replay or test doubles)
+        cached_model = await self._cached_model(model_name) if isinstance(model, genai.GenerativeModel) else None
+        if cached_model is not None:
+            return cached_model, suffix
+        return model, self.compile(suffix)
+
+    async def _cached_model(self, model_name: str):
+        if not (CONTEXT_CACHING and caching and model_name) or len(self.prefix) // 4 < CACHE_MIN_TOKENS:
+            return None
+
+        key = (model_name, self.digest)
+        entry = _context_cache.get(key)
+        now = time.time()
+        if entry and entry[1] > now:
+            return entry[0]
+
+        upload = _pending_uploads.get(key)
+        if upload is None or upload.get_loop() is not asyncio.get_running_loop():
+            # The SDK call blocks for a network round trip; keep it off the event loop
+            upload = asyncio.ensure_future(asyncio.to_thread(self._upload, model_name))
+            _pending_uploads[key] = upload
+            upload.add_done_callback(lambda done: _pending_uploads.pop(key, None) if _pending_uploads.get(key) is done else None)
+        # One waiter being cancelled must not cancel the upload for the others
+        cached_model = await asyncio.shield(upload)
+        if cached_model is None:
+            return None
+
+        # Expire locally a little before the provider does
+        _context_cache[key] = (cached_model, now + CACHE_TTL_SECONDS * 0.9)
+        for stale in [k for k, (_, expiry) in _context_cache.items() if expiry <= now]:
+            del _context_cache[stale]
+        return cached_model
+
+    def _upload(self, model_name: str):
+        try:
+            content = caching.CachedContent.create(
+                model=model_name if model_name.startswith("models/") else f"models/{model_name}",
+                display_name=f"agentforge-{self.digest[:16]}",
+                contents=[self.prefix],
+                ttl=datetime.timedelta(seconds=CACHE_TTL_SECONDS),
+            )
+            return genai.GenerativeModel.from_cached_content(cached_content=content)
+        except Exception as e:
+            print(f"Context caching unavailable for {model_name}: {e}")
+            return None
+
+class ReviewContext(PromptContext):
+    """Prompt context for reviewers of rewritten code (tester, security).
+
+    With a cached prefix the rewrite follows it in the suffix, since the
+    original is already paid for. Otherwise the prompt holds only the code
+    under review: sending the original as well would double the input for
+    nothing. Static facts describe the original, so they are left out.
+    """
+
+    def __init__(self, base: PromptContext, code: str):
+        super().__init__(code)
+        self.base = base
+
+    async def resolve(self, model_name: str, model, suffix: str):
+        cached_model = await self.base._cached_model(model_name) if isinstance(model, genai.GenerativeModel) else None
+        if cached_model is not None:
+            return cached_model, f"The code above was rewritten as follows. Work on this version:\n{self.code}\n{suffix}"
+        return model, self.compile(suffix)
+
+# Recently built contexts, so every agent of a request (and repeat requests) share one prefix
+_recent_contexts: "OrderedDict[str, PromptContext]" = OrderedDict()
+MAX_RECENT_CONTEXTS = 32
+
+def shared_context(code: str, facts: str = "") -> PromptContext:
+    """Return the PromptContext for this code, building it only on first use"""
+    key = hashlib.sha256(f"{code}\0{facts}".encode()).hexdigest()
+    context = _recent_contexts.get(key)
+    if context is None:
+        context = PromptContext(code, facts)
+        _recent_contexts[key] = context
+        if len(_recent_contexts) > MAX_RECENT_CONTEXTS:
+            _recent_contexts.popitem(last=False)
+    else:
+        _recent_contexts.move_to_end(key)
+    return context
+
+def get_prompt_context(input_data: Dict[str, Any], code: Optional[str] = None) -> PromptContext:
+    """Use the request's shared context if the workflow built one, else build a private one.
+
+    `code` is the version the agent works on when it may differ from the
+    code the shared context was built for.
+    """
+    context = input_data.get("context")
+    if context is None:
+        return PromptContext(code if code is not None else input_data.get("code", ""), input_data.get("facts", ""))
+    return context.review(code)
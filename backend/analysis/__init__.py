@@ -0,0 +1 @@
+# Analysis package
\ No newline at end of file
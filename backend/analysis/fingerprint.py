@@ -0,0 +1,103 @@
+# backend/analysis/fingerprint.py
+import ast
+import hashlib
+import json
+import re
+from typing import Dict, List, Tuple, Optional
+from .static_analyzer import tokenize_js, detect_language
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def _python_dump(node: ast.AST) -> str:
+    # Positions are excluded, so formatting, comments and quote style don't matter
+    return ast.dump(node, annotate_fields=False, include_attributes=False)
+
+# After these a "/" starts a regex literal rather than dividing
+REGEX_PRECEDING_KEYWORDS = {"return", "typeof", "case", "in", "of", "new", "delete", "void", "throw", "instanceof", "yield", "await"}
+
+def _has_regex_literal(tokens: List[Tuple[str, str]]) -> bool:
+    """Whether a "/" sits where an expression starts, i.e. opens a regex literal.
+
+    The tokenizer doesn't know regex literals: whitespace inside them is
+    dropped and a `//` inside one reads as a comment, so such code can't
+    be normalized token by token.
+    """
+    previous = None
+    for kind, value in tokens:
+        if value == "/" and (
+            previous is None
+            or (previous[0] == "op" and previous[1] not in (")", "]", "}"))
+            or previous[1] in REGEX_PRECEDING_KEYWORDS
+        ):
+            return True
+        previous = (kind, value)
+    return False
+
+def _normalize_js_tokens(tokens: List[Tuple[str, str]]) -> List[str]:
+    normalized = []
+    for kind, value in tokens:
+        if kind == "string" and value[0] in ("'", '"'):
+            # 'a' and "a" are the same literal
+            body = value[1:-1].replace("\\'", "'").replace('\\"', '"')
+            value = json.dumps(body)
+        normalized.append(value)
+    return normalized
+
+def normalize_code(code: str, language: Optional[str] = None) -> str:
+    """Canonical form of the code: AST dump for Python, comment/whitespace-free tokens for JS/TS"""
+    language = language or detect_language(code)
+    if language == "python":
+        try:
+            return _python_dump(ast.parse(code))
+        except SyntaxError:
+            pass
+    elif language in ("javascript", "typescript"):
+        tokens = tokenize_js(code)
+        if _has_regex_literal(tokens):
+            # Regex contents are significant byte for byte; only the raw text is a safe key
+            return code
+        return "\x1f".join(_normalize_js_tokens(tokens))
+    # Unknown or unparseable: at least ignore whitespace differences
+    return re.sub(r"\s+", " ", code).strip()
+
+def fingerprint(code: str, language: Optional[str] = None) -> str:
+    """Cache key that is stable across whitespace, comment and quote-style edits (JS with regex literals: exact text)"""
+    language = language or detect_language(code)
+    return _digest(f"{language}:{normalize_code(code, language)}")
+
+def function_fingerprints(code: str, language: Optional[str] = None) -> Dict[str, str]:
+    """Fingerprint of each top-level function/class, so overlapping files can be matched piecewise"""
+    language = language or detect_language(code)
+    fingerprints = {}
+    if language == "python":
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return fingerprints
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                fingerprints[node.name] = _digest(f"python:{_python_dump(node)}")
+    elif language in ("javascript", "typescript"):
+        raw_tokens = tokenize_js(code)
+        tokens = _normalize_js_tokens(raw_tokens)
+        i = 0
+        while i < len(tokens):
+            if tokens[i] in ("function", "class") and i + 1 < len(tokens) and tokens[i + 1] not in ("(", "{"):
+                name = tokens[i + 1]
+                start = i
+                # Skip to the body, then to its matching closing brace
+                while i < len(tokens) and tokens[i] != "{":
+                    i += 1
+                depth = 0
+                while i < len(tokens):
+                    depth += {"{": 1, "}": -1}.get(tokens[i], 0)
+                    i += 1
+                    if depth == 0:
+                        break
+                # Functions containing a regex literal can't be normalized safely; leave them out
+                if not _has_regex_literal(raw_tokens[start:i]):
+                    fingerprints[name] = _digest(f"{language}:" + "\x1f".join(tokens[start:i]))
+                continue
+            i += 1
+    return fingerprints
@@ -0,0 +1,367 @@
+# backend/analysis/static_analyzer.py
+import ast
+import re
+from typing import Dict, Any, List, Tuple
+
+# Tokenizer for JavaScript / TypeScript. Regex literals are not recognised,
+# which is fine for metrics and language detection but means brace balance
+# is only a hint (`/\{/` counts as an opening brace).
+JS_TOKEN_PATTERN = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>`(?:\\.|[^`\\])*`|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<number>\b\d[\w.]*)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<op>===|!==|=>|==|!=|<=|>=|&&|\|\||\?\?|\+\+|--|[{}()\[\];,.<>+\-*/%=!?:&|^~@])
+  | (?P<ws>\s+)
+""", re.VERBOSE | re.DOTALL)
+
+# Only tokens that are specific to JS/TS; const/var/async/await/null also appear in Java, Go, C#, C
+JS_KEYWORDS = {"function", "let", "=>", "require", "export", "typeof", "undefined", "===", "!=="}
+TS_KEYWORDS = {"interface", "enum", "implements", "readonly", "namespace", "declare", "keyof"}
+TS_TYPE_NAMES = {"string", "number", "boolean", "any", "void", "unknown", "never"}
+JS_DECISION_TOKENS = {"if", "for", "while", "case", "catch", "&&", "||", "?", "??"}
+JS_LOOP_TOKENS = {"for", "while", "do"}
+
+SECURITY_RULES = {
+    "python": [
+        ("eval", "high", r"\beval\s*\(", "eval() on dynamic input allows arbitrary code execution"),
+        ("exec", "high", r"\bexec\s*\(", "exec() on dynamic input allows arbitrary code execution"),
+        ("pickle", "high", r"\bpickle\.loads?\s*\(", "Unpickling untrusted data allows code execution"),
+        ("yaml_load", "medium", r"\byaml\.load\s*\((?![^)]*SafeLoader)", "yaml.load without SafeLoader"),
+        ("shell_true", "high", r"shell\s*=\s*True", "subprocess with shell=True is open to command injection"),
+        ("os_system", "high", r"\bos\.(system|popen)\s*\(", "Shell command built from strings"),
+        ("sql_format", "high", r"\.execute\s*\(\s*(f[\"']|[\"'][^\"']*[\"']\s*(%|\+|\.format))", "SQL query built with string formatting"),
+        ("weak_hash", "low", r"\bhashlib\.(md5|sha1)\s*\(", "Weak hash algorithm"),
+    ],
+    "javascript": [
+        ("eval", "high", r"\beval\s*\(", "eval() on dynamic input allows arbitrary code execution"),
+        ("new_function", "high", r"\bnew\s+Function\s*\(", "Function constructor evaluates strings as code"),
+        ("inner_html", "medium", r"\.innerHTML\s*=", "Assigning innerHTML is an XSS vector"),
+        ("dangerous_html", "medium", r"dangerouslySetInnerHTML", "dangerouslySetInnerHTML is an XSS vector"),
+        ("document_write", "medium", r"\bdocument\.write\s*\(", "document.write is an XSS vector"),
+        ("child_process", "high", r"\b(exec|execSync)\s*\(\s*[`\"'][^`\"']*(\$\{|[`\"']\s*\+)", "Shell command built from strings"),
+        ("sql_concat", "high", r"\.query\s*\(\s*(`[^`]*\$\{|[\"'][^\"']*[\"']\s*\+)", "SQL query built with string concatenation"),
+    ],
+}
+SECURITY_RULES["typescript"] = SECURITY_RULES["javascript"]
+HARDCODED_SECRET = ("hardcoded_secret", "medium",
+                    r"(?i)\b(password|passwd|secret|api_?key|token)\b\s*[:=]\s*[\"'][^\"']{4,}[\"']",
+                    "Hardcoded credential")
+
+MIN_MEANINGFUL_TOKENS = 3
+
+def tokenize_js(code: str) -> List[Tuple[str, str]]:
+    """Tokenize JavaScript/TypeScript into (kind, value) pairs, dropping whitespace and comments"""
+    tokens = []
+    position = 0
+    while position < len(code):
+        match = JS_TOKEN_PATTERN.match(code, position)
+        if not match:
+            tokens.append(("other", code[position]))
+            position += 1
+            continue
+        kind = match.lastgroup
+        if kind not in ("ws", "comment"):
+            tokens.append((kind, match.group()))
+        position = match.end()
+    return tokens
+
+def _looks_like_python(code: str) -> bool:
+    return bool(re.search(r"^\s*(def \w+\s*\(|class \w+.*:\s*$|import \w+\s*$|from [\w.]+ import )", code, re.MULTILINE))
+
+def _looks_like_javascript(code: str) -> bool:
+    # Snippets such as `module.exports = { a: 1 };` also parse as Python
+    return bool(re.search(r"\bmodule\.exports\b|\bexports\.\w+\s*=|\brequire\s*\(|\bconsole\.\w+\s*\(|\bdocument\.\w+", code))
+
+# Other brace languages (Java, C#, Go, C/C++, Rust): the agents work these out themselves
+OTHER_LANGUAGE_PATTERN = re.compile(r"""
+    ^\s*(package\s+[\w.]+\s*;?|\#include\b|using\s+[\w.]+\s*;)
+  | \b(public|private|protected)\s+(static\s+|final\s+|abstract\s+)*(class|interface|enum|void|int|long|boolean|String)\b
+  | \bfunc\s+(\([^)]*\)\s*)?\w+\s*\(
+  | \bfn\s+\w+\s*[(<]
+  | \bSystem\.out\.|\bfmt\.\w+\s*\(|\bstd::
+""", re.VERBOSE | re.MULTILINE)
+
+def detect_language(code: str, tokens: List[Tuple[str, str]] = None) -> str:
+    """Detect the language of a snippet: python, javascript, typescript or unknown"""
+    if not code.strip():
+        return "unknown"
+    # def/class/import lines mark Python even when the code has a syntax error (dicts and f-strings contain braces)
+    if _looks_like_python(code):
+        return "python"
+    try:
+        ast.parse(code)
+        parses = True
+    except (SyntaxError, ValueError):
+        parses = False
+    js_markers = _looks_like_javascript(code)
+    if parses and not js_markers:
+        return "python"
+    if not js_markers and OTHER_LANGUAGE_PATTERN.search(code):
+        return "unknown"
+
+    tokens = tokens if tokens is not None else tokenize_js(code)
+    values = [value for _, value in tokens]
+    names = set(values)
+    if names & TS_KEYWORDS:
+        return "typescript"
+    for i in range(len(values) - 2):
+        # Type annotations such as `x: number` or `): string`
+        if values[i + 1] == ":" and values[i + 2] in TS_TYPE_NAMES and tokens[i][0] in ("name", "op"):
+            return "typescript"
+    if names & JS_KEYWORDS or js_markers:
+        return "javascript"
+    return "python" if parses else "unknown"
+
+class _PythonMetrics(ast.NodeVisitor):
+    """Collects per-function complexity metrics from a Python AST"""
+
+    def __init__(self):
+        self.functions = []
+        self.classes = []
+        self.imports = []
+
+    def visit_Import(self, node):
+        self.imports.extend(alias.name for alias in node.names)
+
+    def visit_ImportFrom(self, node):
+        if node.module:
+            self.imports.append(node.module)
+
+    def visit_ClassDef(self, node):
+        self.classes.append(node.name)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        self.functions.append({
+            "name": node.name,
+            "line": node.lineno,
+            "args": len(node.args.args),
+            "cyclomatic": _cyclomatic(node),
+            "loop_depth": _loop_depth(node),
+            "recursive": any(
+                isinstance(child, ast.Call) and isinstance(child.func, ast.Name) and child.func.id == node.name
+                for child in ast.walk(node)
+            ),
+        })
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+def _cyclomatic(node: ast.AST) -> int:
+    complexity = 1
+    for child in ast.walk(node):
+        if isinstance(child, (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.Assert, ast.comprehension)):
+            complexity += 1
+        elif isinstance(child, ast.BoolOp):
+            complexity += len(child.values) - 1
+    return complexity
+
+def _loop_depth(node: ast.AST, depth: int = 0) -> int:
+    deepest = depth
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        is_loop = isinstance(child, (ast.For, ast.AsyncFor, ast.While, ast.comprehension))
+        deepest = max(deepest, _loop_depth(child, depth + 1 if is_loop else depth))
+    return deepest
+
+def _analyze_python(code: str, analysis: Dict[str, Any]) -> None:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        analysis["syntax_error"] = {"line": e.lineno, "column": e.offset, "message": e.msg}
+        return
+
+    metrics = _PythonMetrics()
+    metrics.visit(tree)
+    analysis["functions"] = metrics.functions
+    analysis["classes"] = metrics.classes
+    analysis["imports"] = metrics.imports
+    analysis["executable_statements"] = sum(
+        1 for stmt in tree.body
+        if not isinstance(stmt, (ast.Import, ast.ImportFrom))
+        and not (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant))
+    )
+    analysis["cyclomatic"] = _cyclomatic(tree)
+    analysis["loop_depth"] = max([_loop_depth(tree)] + [f["loop_depth"] for f in metrics.functions])
+
+def _analyze_js(tokens: List[Tuple[str, str]], analysis: Dict[str, Any]) -> None:
+    functions = []
+    imports = []
+    stack = []  # one entry per open brace: (is_loop, index of the function it opens or None)
+    paren_depth = 0
+    max_loop_depth = 0
+    pending_loop = False
+    pending_function = None
+    balance_error = None
+
+    for i, (kind, value) in enumerate(tokens):
+        nxt = tokens[i + 1] if i + 1 < len(tokens) else ("", "")
+        if value == "function" and nxt[0] == "name":
+            pending_function = nxt[1]
+        elif value == "=>" and pending_function is None:
+            # const name = (...) => { ... }
+            for j in range(i - 1, 0, -1):
+                if tokens[j][1] == "=" and tokens[j - 1][0] == "name":
+                    pending_function = tokens[j - 1][1]
+                    break
+                if tokens[j][1] in (";", "{", "}"):
+                    break
+        elif value in ("require", "from") and kind == "name":
+            candidate = tokens[i + 2] if value == "require" and i + 2 < len(tokens) else nxt
+            if candidate[0] == "string":
+                imports.append(candidate[1][1:-1])
+
+        if value in JS_LOOP_TOKENS:
+            pending_loop = True
+        elif value == "(":
+            paren_depth += 1
+        elif value == ")":
+            paren_depth = max(paren_depth - 1, 0)
+        elif value == ";" and paren_depth == 0:
+            pending_loop = False
+        elif value == "{":
+            function_index = None
+            if pending_function is not None:
+                functions.append({"name": pending_function, "line": None, "cyclomatic": 1, "loop_depth": 0})
+                function_index = len(functions) - 1
+                pending_function = None
+            stack.append((pending_loop, function_index))
+            pending_loop = False
+            loops_inside = 0
+            for is_loop, index in reversed(stack):
+                loops_inside += 1 if is_loop else 0
+                if index is not None:
+                    functions[index]["loop_depth"] = max(functions[index]["loop_depth"], loops_inside)
+            max_loop_depth = max(max_loop_depth, loops_inside)
+        elif value == "}":
+            if not stack:
+                balance_error = "Unbalanced closing brace"
+                continue
+            stack.pop()
+
+        if value in JS_DECISION_TOKENS:
+            for _, index in stack:
+                if index is not None:
+                    functions[index]["cyclomatic"] += 1
+
+    if stack and balance_error is None:
+        balance_error = "Unclosed brace"
+    if balance_error:
+        # Regex literals aren't tokenized, so this is a hint for the agents, not grounds to reject
+        analysis["warnings"].append(f"{balance_error} (brace check ignores regex literals)")
+
+    analysis["functions"] = functions
+    analysis["imports"] = imports
+    analysis["classes"] = [tokens[i + 1][1] for i, (_, value) in enumerate(tokens[:-1]) if value == "class" and tokens[i + 1][0] == "name"]
+    analysis["executable_statements"] = sum(1 for kind, _ in tokens if kind in ("name", "number", "string"))
+    analysis["cyclomatic"] = 1 + sum(1 for _, value in tokens if value in JS_DECISION_TOKENS)
+    analysis["loop_depth"] = max_loop_depth
+
+def _security_findings(code: str, language: str) -> List[Dict[str, Any]]:
+    findings = []
+    rules = SECURITY_RULES.get(language, []) + [HARDCODED_SECRET]
+    for rule, severity, pattern, message in rules:
+        for match in re.finditer(pattern, code, re.MULTILINE):
+            findings.append({
+                "rule": rule,
+                "severity": severity,
+                "line": code.count("\n", 0, match.start()) + 1,
+                "message": message,
+            })
+    findings.sort(key=lambda f: f["line"])
+    return findings
+
+def estimate_complexity(loop_depth: int, recursive: bool = False) -> str:
+    """Rough Big O estimate from loop nesting depth"""
+    if recursive:
+        return "recursive (depends on branching)"
+    if loop_depth == 0:
+        return "O(1)"
+    if loop_depth == 1:
+        return "O(n)"
+    return f"O(n^{loop_depth})"
+
+def analyze_code(code: str) -> Dict[str, Any]:
+    """Run the local static analysis and decide whether the code needs the agents at all"""
+    analysis = {
+        "language": "unknown",
+        "lines": len(code.splitlines()),
+        "loc": sum(1 for line in code.splitlines() if line.strip() and not line.strip().startswith(("#", "//"))),
+        "functions": [],
+        "classes": [],
+        "imports": [],
+        "security_findings": [],
+        "syntax_error": None,
+        "warnings": [],
+        "verdict": "proceed",
+        "reason": None,
+        "summary": "",
+    }
+
+    if not code.strip():
+        analysis["verdict"] = "reject"
+        analysis["reason"] = "No code provided"
+        return analysis
+
+    tokens = tokenize_js(code)
+    language = detect_language(code, tokens)
+    analysis["language"] = language
+
+    if language == "python":
+        _analyze_python(code, analysis)
+    elif language in ("javascript", "typescript"):
+        _analyze_js(tokens, analysis)
+
+    analysis["security_findings"] = _security_findings(code, language)
+
+    if analysis["syntax_error"]:
+        error = analysis["syntax_error"]
+        location = f" (line {error['line']})" if error["line"] else ""
+        analysis["verdict"] = "reject"
+        analysis["reason"] = f"Syntax error{location}: {error['message']}"
+    elif len(tokens) < MIN_MEANINGFUL_TOKENS:
+        analysis["verdict"] = "reject"
+        analysis["reason"] = "Input is too short to analyze"
+    elif analysis.get("executable_statements", 1) == 0 and not analysis["functions"] and not analysis["classes"]:
+        analysis["verdict"] = "reject"
+        analysis["reason"] = "Input has no executable code (only comments, imports or docstrings)"
+
+    analysis["summary"] = summarize_analysis(analysis)
+    return analysis
+
+def summarize_analysis(analysis: Dict[str, Any]) -> str:
+    """Compact fact sheet for agent prompts"""
+    if analysis["language"] == "unknown":
+        # Nothing trustworthy to say; the agents identify the language themselves
+        facts = [f"{analysis['loc']} lines of code"]
+    else:
+        facts = [f"Language: {analysis['language']}, {analysis['loc']} lines of code"]
+
+    functions = analysis.get("functions", [])
+    if functions:
+        listed = ", ".join(
+            f"{f['name']} (cyclomatic {f['cyclomatic']}, est. {estimate_complexity(f['loop_depth'], f.get('recursive', False))})"
+            for f in functions[:10]
+        )
+        more = f" and {len(functions) - 10} more" if len(functions) > 10 else ""
+        facts.append(f"Functions: {listed}{more}")
+    if analysis.get("classes"):
+        facts.append(f"Classes: {', '.join(analysis['classes'][:10])}")
+    if analysis.get("imports"):
+        facts.append(f"Imports: {', '.join(sorted(set(analysis['imports']))[:15])}")
+    if "loop_depth" in analysis:
+        facts.append(f"Max loop nesting: {analysis['loop_depth']}")
+
+    findings = analysis.get("security_findings", [])
+    if findings:
+        facts.append("Security flags: " + "; ".join(
+            f"{f['rule']} at line {f['line']} ({f['severity']})" for f in findings[:10]
+        ))
+    else:
+        facts.append("Security flags: none detected by pattern scan")
+    if analysis.get("warnings"):
+        facts.append("Warnings: " + "; ".join(analysis["warnings"]))
+
+    return "\n".join(facts)
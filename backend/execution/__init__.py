@@ -0,0 +1 @@
+# Execution package
\ No newline at end of file
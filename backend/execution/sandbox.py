@@ -0,0 +1,374 @@
+# backend/execution/sandbox.py
+import ast
+import asyncio
+import json
+import math
+import os
+import shlex
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional, Union
+
+# Script executed inside every sandboxed subprocess. It loads the candidate
+# code as module `solution`, then either runs test code against it or times
+# one of its functions on growing inputs. Results go to result.json.
+HARNESS = r'''
+import contextlib, io, json, random, sys, time, unittest
+
+sys.path.insert(0, ".")
+config = json.load(open("config.json"))
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, timeouts still apply
+    resource = None
+if resource:
+    # Applied here, before the candidate code loads, rather than from the server process
+    limits = config["limits"]
+    resource.setrlimit(resource.RLIMIT_CPU, (limits["cpu_seconds"],) * 2)
+    resource.setrlimit(resource.RLIMIT_AS, (limits["memory_mb"] * 1024 * 1024,) * 2)
+    resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024,) * 2)
+    if limits.get("max_processes"):
+        # Counted per uid, so only meaningful once dropped to the sandbox uid
+        resource.setrlimit(resource.RLIMIT_NPROC, (limits["max_processes"],) * 2)
+
+def write(result):
+    with open("result.json", "w") as f:
+        json.dump(result, f)
+
+def describe(e):
+    # Exception type and a short message only; the host scrubs and caps it again
+    return (type(e).__name__ + ": " + str(e))[:300]
+
+try:
+    with contextlib.redirect_stdout(io.StringIO()):
+        import solution
+except BaseException as e:
+    write({"status": "error", "error": "Code failed to load: " + describe(e)})
+    sys.exit(0)
+
+def run_tests(source):
+    namespace = dict(vars(solution))
+    lines = source.splitlines()
+    # Drop top-level imports of modules the model invented (e.g. `from my_module import f`);
+    # the names already come from the solution namespace.
+    for i, line in enumerate(lines):
+        if line.startswith(("import ", "from ")):
+            try:
+                exec(line, namespace)
+            except ImportError:
+                lines[i] = ""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(compile("\n".join(lines), "tests.py", "exec"), namespace)
+    except BaseException as e:
+        return {"status": "not_executable", "error": describe(e), "passed": 0, "failed": 0, "failures": []}
+
+    passed, failures, durations = 0, [], {}
+    for name, obj in list(namespace.items()):
+        if name.startswith("test") and callable(obj) and not isinstance(obj, type):
+            start = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    obj()
+                passed += 1
+            except BaseException as e:
+                failures.append({"test": name, "error": describe(e)})
+            durations[name] = round(time.perf_counter() - start, 6)
+        elif isinstance(obj, type) and issubclass(obj, unittest.TestCase) and obj is not unittest.TestCase:
+            outcome = unittest.TextTestRunner(stream=io.StringIO(), verbosity=0).run(
+                unittest.defaultTestLoader.loadTestsFromTestCase(obj))
+            passed += outcome.testsRun - len(outcome.failures) - len(outcome.errors)
+            failures.extend({"test": str(case), "error": trace.strip().splitlines()[-1][:300]}
+                            for case, trace in outcome.failures + outcome.errors)
+    status = "passed" if not failures else "failed"
+    if not passed and not failures:
+        status = "no_tests"
+    return {"status": status, "passed": passed, "failed": len(failures), "failures": failures[:20], "durations": durations}
+
+def make_args(shape, n):
+    values = {
+        "list": lambda: [random.randint(-n, n) for _ in range(n)],
+        "int": lambda: n,
+        "str": lambda: "".join(random.choice("abcdefgh") for _ in range(n)),
+    }
+    return [values[kind]() for kind in shape]
+
+def time_function(name, shapes, sizes, call_budget):
+    fn = getattr(solution, name)
+    chosen = None
+    for shape in shapes:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn(*make_args(shape, 8))
+            chosen = shape
+            break
+        except BaseException:
+            continue
+    if chosen is None:
+        return {"status": "skipped", "error": "No supported input shape"}
+
+    timings = []
+    for n in sizes:
+        best, spent, calls = None, 0.0, 0
+        while calls < 20 and spent < 0.005:
+            args = make_args(chosen, n)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                fn(*args)
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            spent += elapsed
+            calls += 1
+        timings.append([n, best])
+        if best > call_budget:
+            break
+    return {"status": "measured", "input_shape": chosen, "timings": timings}
+
+if config["mode"] == "tests":
+    write(run_tests(config["tests"]))
+else:
+    write(time_function(config["function"], config["shapes"], config["sizes"], config["call_budget"]))
+'''
+
+COMPLEXITY_MODELS = [
+    ("O(1)", lambda n: 1.0),
+    ("O(log n)", lambda n: math.log2(n)),
+    ("O(n)", lambda n: float(n)),
+    ("O(n log n)", lambda n: n * math.log2(n)),
+    ("O(n^2)", lambda n: float(n) ** 2),
+    ("O(n^3)", lambda n: float(n) ** 3),
+]
+
+# Timings whose spread stays under this factor are flat: at sub-microsecond scale
+# timer noise alone can fake a log-shaped curve
+FLAT_RATIO = 2.5
+
+INPUT_SHAPES = {
+    1: [["list"], ["int"], ["str"]],
+    2: [["list", "int"], ["str", "str"], ["list", "list"]],
+}
+
+def estimate_big_o(timings: List[List[float]]) -> Optional[str]:
+    """Pick the growth model whose shape best fits the measured (n, seconds) pairs"""
+    points = [(n, t) for n, t in timings if t and t > 0]
+    if len(points) < 3:
+        return None
+    times = [t for _, t in points]
+    if max(times) <= FLAT_RATIO * min(times):
+        return "O(1)"
+
+    best_name, best_error = None, None
+    for name, model in COMPLEXITY_MODELS:
+        # Least squares in log space with a free constant factor
+        residuals = [math.log(t) - math.log(model(n)) for n, t in points]
+        mean = sum(residuals) / len(residuals)
+        error = sum((r - mean) ** 2 for r in residuals)
+        # Simpler models win ties so timer noise doesn't inflate the estimate
+        if best_error is None or error < best_error * 0.8:
+            best_name, best_error = name, error
+    return best_name
+
+def _join_tests(tests: Union[str, List[Any], None]) -> str:
+    """Merge the model's test snippets, dropping entries that are not Python (e.g. `// Unit tests added`)"""
+    if not tests:
+        return ""
+    if isinstance(tests, str):
+        return tests
+    blocks = []
+    for block in tests:
+        if not isinstance(block, str):
+            continue
+        try:
+            compile(block, "tests.py", "exec")
+        except SyntaxError:
+            continue
+        blocks.append(block)
+    return "\n\n".join(blocks)
+
+# Unprivileged uid the sandbox runs as when the server itself runs as root
+SANDBOX_UID = int(os.getenv("AGENTFORGE_SANDBOX_UID", "65534"))
+
+UNAVAILABLE = "No sandbox isolation available (install bubblewrap or set AGENTFORGE_SANDBOX_COMMAND)"
+
+# Longest error text returned to clients per failure
+MAX_ERROR_CHARS = 300
+
+def _bubblewrap_command(python: str) -> Optional[List[str]]:
+    """bwrap prefix: no network, own pid/ipc/uts namespaces, cleared env, read-only system dirs"""
+    bwrap = shutil.which("bwrap")
+    if not bwrap:
+        return None
+    command = [bwrap, "--unshare-all", "--die-with-parent", "--new-session", "--clearenv",
+               "--uid", str(SANDBOX_UID), "--gid", str(SANDBOX_UID),
+               "--setenv", "PATH", "/usr/bin:/bin", "--setenv", "PYTHONHASHSEED", "0"]
+    for path in ("/bin", "/lib", "/lib64", "/sbin"):
+        # Merged-/usr systems make these symlinks into /usr
+        if os.path.islink(path):
+            command += ["--symlink", os.readlink(path), path]
+        elif os.path.isdir(path):
+            command += ["--ro-bind", path, path]
+    command += ["--ro-bind", "/usr", "/usr"]
+    for prefix in sorted({sys.base_prefix, sys.prefix, os.path.dirname(os.path.realpath(python))}):
+        if not prefix.startswith("/usr/"):
+            command += ["--ro-bind", prefix, prefix]
+    command += ["--proc", "/proc", "--dev", "/dev", "--tmpfs", "/tmp",
+                "--bind", "{workdir}", "/sandbox", "--chdir", "/sandbox"]
+    return command
+
+def isolation_command(python: str = sys.executable) -> Optional[List[str]]:
+    """Command prefix that runs the harness isolated from the host, or None when none is available.
+
+    AGENTFORGE_SANDBOX_COMMAND overrides bubblewrap with another isolation
+    tool (nsjail, a container runtime, ...); "{workdir}" in it is replaced
+    by the job directory, and the harness is appended as
+    `<python> -I harness.py`, which must run with that directory as cwd.
+    """
+    custom = os.getenv("AGENTFORGE_SANDBOX_COMMAND", "").strip()
+    if custom:
+        return shlex.split(custom)
+    return _bubblewrap_command(python)
+
+def _scrub(text: str, secrets: List[str]) -> str:
+    for secret in secrets:
+        text = text.replace(secret, "<redacted>")
+    return text[:MAX_ERROR_CHARS]
+
+def _sanitize(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Cap error text and strip host environment values that generated code could have read"""
+    secrets = sorted((value for value in os.environ.values() if len(value) >= 8), key=len, reverse=True)
+    if isinstance(result.get("error"), str):
+        result["error"] = _scrub(result["error"], secrets)
+    for failure in result.get("failures") or []:
+        if isinstance(failure, dict) and isinstance(failure.get("error"), str):
+            failure["error"] = _scrub(failure["error"], secrets)
+    return result
+
+class SandboxRunner:
+    """Runs generated code and tests in isolated, resource-limited Python subprocesses.
+
+    Jobs only run under an isolation command (bubblewrap by default, see
+    isolation_command()); without one every job reports "unavailable"
+    rather than executing untrusted code next to the server.
+    """
+
+    def __init__(self, timeout: float = 10.0, memory_limit_mb: int = 512, max_workers: Optional[int] = None,
+                 sizes: Optional[List[int]] = None, isolation: Optional[List[str]] = None):
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.sizes = sizes or [250, 500, 1000, 2000, 4000, 8000]
+        self.isolation = isolation if isolation is not None else isolation_command()
+        self._slots = asyncio.Semaphore(self.max_workers)
+
+    async def _run_job(self, code: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.isolation:
+            return {"status": "unavailable", "error": UNAVAILABLE}
+        async with self._slots:
+            with tempfile.TemporaryDirectory(prefix="agentforge-sandbox-") as workdir:
+                root = os.getuid() == 0 if hasattr(os, "getuid") else False
+                config = dict(config, limits={
+                    "cpu_seconds": int(self.timeout) + 1,
+                    "memory_mb": self.memory_limit_mb,
+                    "max_processes": 32 if root else None
+                })
+                for filename, content in (("solution.py", code), ("harness.py", HARNESS), ("config.json", json.dumps(config))):
+                    with open(os.path.join(workdir, filename), "w") as f:
+                        f.write(content)
+                if root:
+                    # Never run generated code as root, even inside a namespace
+                    os.chown(workdir, SANDBOX_UID, SANDBOX_UID)
+                    for filename in os.listdir(workdir):
+                        os.chown(os.path.join(workdir, filename), SANDBOX_UID, SANDBOX_UID)
+
+                command = [part.replace("{workdir}", workdir) for part in self.isolation]
+                started = time.perf_counter()
+                process = await asyncio.create_subprocess_exec(
+                    *command, sys.executable, "-I", "harness.py",
+                    cwd=workdir,
+                    env={"PATH": os.environ.get("PATH", ""), "PYTHONHASHSEED": "0"},
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                    # No preexec_fn: it is unsafe with the model-call threads running in this process
+                    start_new_session=True,
+                    user=SANDBOX_UID if root else None,
+                    group=SANDBOX_UID if root else None,
+                    extra_groups=[] if root else None,
+                )
+                try:
+                    _, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+                except asyncio.TimeoutError:
+                    try:
+                        # The job runs in its own session; take any children with it
+                        os.killpg(process.pid, signal.SIGKILL) if hasattr(os, "killpg") else process.kill()
+                    except ProcessLookupError:
+                        pass
+                    await process.wait()
+                    return {"status": "timeout", "error": f"Exceeded {self.timeout}s", "duration": self.timeout}
+                duration = round(time.perf_counter() - started, 4)
+
+                result_path = os.path.join(workdir, "result.json")
+                if not os.path.exists(result_path):
+                    stderr_text = stderr.decode(errors="replace").strip()
+                    return _sanitize({
+                        "status": "crashed",
+                        "error": (stderr_text.splitlines()[-1] if stderr_text else "") or f"Exit code {process.returncode}",
+                        "duration": duration
+                    })
+                with open(result_path) as f:
+                    result = json.load(f)
+                result["duration"] = duration
+                return _sanitize(result)
+
+    async def run_tests(self, code: str, tests: Union[str, List[Any], None]) -> Dict[str, Any]:
+        """Execute test functions / TestCase classes against the code"""
+        source = _join_tests(tests)
+        if not source.strip():
+            return {"status": "no_tests", "passed": 0, "failed": 0, "failures": []}
+        return await self._run_job(code, {"mode": "tests", "tests": source})
+
+    async def measure_complexity(self, code: str, function: str, arg_count: int) -> Dict[str, Any]:
+        """Time a function on scaled inputs and estimate its empirical Big O"""
+        result = await self._run_job(code, {
+            "mode": "complexity",
+            "function": function,
+            "shapes": INPUT_SHAPES[arg_count],
+            "sizes": self.sizes,
+            "call_budget": self.timeout / (2 * len(self.sizes)),
+        })
+        if result.get("status") == "measured":
+            result["estimated"] = estimate_big_o(result["timings"])
+        return result
+
+    async def verify(self, code: str, unit_tests: Any = None, performance_tests: Any = None) -> Dict[str, Any]:
+        """Run unit tests, performance tests and complexity probes in parallel"""
+        if not self.isolation:
+            return {"status": "unavailable", "error": UNAVAILABLE}
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            return {"status": "not_executable", "error": f"Improved code does not parse: {e.msg} (line {e.lineno})"}
+
+        probes = {}
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef) and not node.name.startswith("_"):
+                required = len(node.args.args) - len(node.args.defaults)
+                if required in INPUT_SHAPES:
+                    probes[node.name] = required
+
+        started = time.perf_counter()
+        jobs = [self.run_tests(code, unit_tests), self.run_tests(code, performance_tests)]
+        jobs.extend(self.measure_complexity(code, name, arg_count) for name, arg_count in probes.items())
+        results = await asyncio.gather(*jobs)
+
+        return {
+            "status": "completed",
+            "unit_tests": results[0],
+            "performance_tests": results[1],
+            "complexity": dict(zip(probes, results[2:])),
+            "wall_time": round(time.perf_counter() - started, 4),
+        }
@@ -1,14 +1,35 @@
 # backend/main.py
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 import google.generativeai as genai
 import os
 from typing import List, Dict
 import json
 import asyncio
-import hashlib
-from workflow.agent_workflow import create_agent_forge_workflow, AgentForgeState
+import base64
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from workflow.agent_workflow import create_agent_forge_workflow, AgentForgeState, checkpoint_key
+from workflow.checkpoint import create_checkpointer
+from workflow.admission import AdmissionController
 from memory.memory_manager import MemoryManager
+from memory.result_cache import ResultCache
+from analysis.static_analyzer import analyze_code, estimate_complexity
+from analysis.fingerprint import fingerprint, function_fingerprints
+from transport.payloads import compact_result, encode_payload, wants_compact, wants_msgpack
+from tracing.recorder import get_tracer
+from repository.ingest import load_directory, load_archive, load_files
+from repository.symbol_index import SymbolIndex
+from repository.scheduler import review_repository
+from transport.payloads import content_hash
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # brotli is optional, gzip covers every client
+    BrotliMiddleware = None
 
 app = FastAPI(title="AgentForge API")
 
@@ -21,28 +42,106 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses; BrotliMiddleware serves br when accepted and falls back to gzip
+if BrotliMiddleware:
+    app.add_middleware(BrotliMiddleware, minimum_size=1000)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 # Configure Gemini API
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 model = genai.GenerativeModel('gemini-2.5-flash')
 
-# Initialize workflow and memory
-workflow = create_agent_forge_workflow()
+# Initialize workflow and memory; checkpoints let retried runs skip completed agents
+checkpointer = create_checkpointer()
+workflow = create_agent_forge_workflow(checkpointer)
+# Architect-only graph used when degrading under load (cheap enough not to checkpoint)
+reduced_workflow = create_agent_forge_workflow(agent_set="reduced")
 memory_manager = MemoryManager()
 
-# Simple cache for faster responses
-response_cache = {}
+# Bounds concurrent runs and sheds load by priority when saturated
+admission = AdmissionController.from_env()
+RUN_TIMEOUT = float(os.getenv("AGENTFORGE_RUN_TIMEOUT", "120"))
+
+# Fast-path outputs keyed by code fingerprint (so formatting-only edits still hit) and the
+# agent outputs of clean workflow runs, keyed by exact code, served when shedding load
+response_cache = ResultCache(int(os.getenv("AGENTFORGE_RESPONSE_CACHE_SIZE", "128")))
+
+# Extra attempts when an agent fell back; each resumes after the last completed node
+AUTO_RESUME_ATTEMPTS = int(os.getenv("AGENTFORGE_AUTO_RESUME_ATTEMPTS", "1"))
+
+# Demo mode answers from the local fast path instead of running the agents
+FAST_RESPONSE_MODE = os.getenv("AGENTFORGE_FAST_MODE", "true").lower() == "true"
+
+# Repository mode: symbol indexes persist here between submissions of the same repository
+REPO_INDEX_DIR = os.getenv("AGENTFORGE_INDEX_DIR", ".agentforge_index")
+# Server-side directories may only be reviewed under this root (unset: uploads only)
+REPO_ROOT = os.getenv("AGENTFORGE_REPO_ROOT")
+REPO_MAX_CONCURRENCY = int(os.getenv("AGENTFORGE_REPO_CONCURRENCY", "4"))
+# Index directory -> [lock, requests using it]; entries go away once nobody holds or awaits them
+index_locks: Dict[str, list] = {}
+
+@asynccontextmanager
+async def index_lock(index_dir: str):
+    """Serialize reviews that share a persistent index directory"""
+    entry = index_locks.setdefault(index_dir, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield index_dir
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del index_locks[index_dir]
 
 # WebSocket connections for real-time updates
+# (uvicorn negotiates permessage-deflate with clients by default, see --ws-per-message-deflate)
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        # Per-connection wire format: {"compact": bool, "binary": bool}
+        self.preferences: Dict[WebSocket, Dict[str, bool]] = {}
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
+        # Clients opt in with /ws/agent-updates?compact=1&encoding=msgpack
+        params = websocket.query_params
+        self.preferences[websocket] = {
+            "compact": wants_compact(params.get("compact")),
+            "binary": params.get("encoding") == "msgpack"
+        }
 
     def disconnect(self, websocket: WebSocket):
         self.active_connections.remove(websocket)
+        self.preferences.pop(websocket, None)
+
+    async def broadcast_result(self, result: Dict):
+        """Send a finished run to every client, encoding each requested format only once"""
+        encoded = {}
+        compacted = None
+        for connection in list(self.active_connections):
+            preference = self.preferences.get(connection, {})
+            variant = (preference.get("compact", False), preference.get("binary", False))
+            if variant not in encoded:
+                compact, binary = variant
+                if compact:
+                    # Diffing is CPU work; keep it off the event loop and do it once per broadcast
+                    if compacted is None:
+                        compacted = await asyncio.to_thread(compact_result, result)
+                    data = {"result": compacted}
+                else:
+                    data = {"agent_outputs": result["agent_outputs"]}
+                data["message"] = "Code processing completed"
+                encoded[variant] = encode_payload({"type": "processing_complete", "data": data}, binary)
+            body, media_type = encoded[variant]
+            try:
+                if media_type == "application/json":
+                    await connection.send_text(body.decode())
+                else:
+                    await connection.send_bytes(body)
+            except Exception as e:
+                print(f"Error sending to WebSocket: {e}")
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
@@ -57,17 +156,37 @@ manager = ConnectionManager()
 async def root():
     return {"message": "AgentForge API is running"}
 
-def generate_fast_response(code: str) -> Dict:
+def generate_fast_response(code: str, analysis: Dict = None) -> Dict:
     """Generate a fast response for demo purposes"""
-    code_hash = hashlib.md5(code.encode()).hexdigest()
+    # Generate intelligent response based on static analysis of the code
+    analysis = analysis or analyze_code(code)
+    findings = analysis["security_findings"]
+    loop_depth = analysis.get("loop_depth", 0)
     
-    if code_hash in response_cache:
-        return response_cache[code_hash]
+    # Only outputs that follow from the code's structure are shared between fingerprint-equal
+    # submissions; the rewrite, findings (line numbers) and analysis come from this request's text
+    cache_key = ("fast", fingerprint(code, analysis["language"]), loop_depth)
+    shared = response_cache.get(cache_key)
+    if shared is None:
+        shared = {
+            "architect": {
+                "analysis": "Code structure analysis completed",
+                "improvements": ["Add input validation", "Improve error handling", "Add documentation"],
+                "patterns": ["Use early returns", "Follow naming conventions"],
+                "performance": ["Optimize loops", "Use efficient data structures"],
+                "security": ["Validate inputs", "Handle edge cases"]
+            },
+            "tester": {
+                "unit_tests": ["// Test for normal case", "// Test for edge cases"],
+                "edge_cases": ["// Test with empty input", "// Test with null values"],
+                "error_tests": ["// Test error handling"],
+                "performance_notes": [f"Estimated time complexity: {estimate_complexity(loop_depth)} (max loop nesting {loop_depth})"]
+            }
+        }
+        response_cache.set(cache_key, shared)
     
-    # Generate intelligent response based on code content
-    is_python = 'def ' in code or 'import ' in code
-    is_javascript = 'function ' in code or 'const ' in code or 'let ' in code
-    is_react = 'return (' in code or 'JSX' in code
+    is_python = analysis["language"] == "python"
+    is_javascript = analysis["language"] in ("javascript", "typescript")
     
     if is_python:
         improved_code = code.replace('def ', 'def improved_')
@@ -86,19 +205,13 @@ def generate_fast_response(code: str) -> Dict:
     else:
         improved_code = code + "\n\n// Improved version with better practices"
     
-    response = {
+    return {
         "success": True,
         "result": {
             "agent_outputs": [
                 {
                     "agent": "architect",
-                    "output": {
-                        "analysis": "Code structure analysis completed",
-                        "improvements": ["Add input validation", "Improve error handling", "Add documentation"],
-                        "patterns": ["Use early returns", "Follow naming conventions"],
-                        "performance": ["Optimize loops", "Use efficient data structures"],
-                        "security": ["Validate inputs", "Handle edge cases"]
-                    },
+                    "output": shared["architect"],
                     "timestamp": "2025-01-20T10:00:00Z"
                 },
                 {
@@ -107,40 +220,74 @@ def generate_fast_response(code: str) -> Dict:
                         "improved_code": improved_code,
                         "comments": ["Added input validation", "Improved error handling"],
                         "tests": ["// Unit tests added", "// Edge case tests"],
-                        "benchmarks": ["Performance improved by 20%"]
+                        "benchmarks": ["Not measured in fast response mode"]
                     },
                     "timestamp": "2025-01-20T10:00:00Z"
                 },
                 {
                     "agent": "tester",
-                    "output": {
-                        "unit_tests": ["// Test for normal case", "// Test for edge cases"],
-                        "edge_cases": ["// Test with empty input", "// Test with null values"],
-                        "error_tests": ["// Test error handling"],
-                        "performance_notes": ["Time complexity: O(n)", "Space complexity: O(1)"]
-                    },
+                    "output": shared["tester"],
                     "timestamp": "2025-01-20T10:00:00Z"
                 },
                 {
                     "agent": "security",
                     "output": {
-                        "vulnerabilities": ["No critical vulnerabilities found"],
-                        "risk_level": "Low",
+                        "vulnerabilities": [
+                            f"{f['message']} (line {f['line']})" for f in findings
+                        ] or ["No critical vulnerabilities found"],
+                        "risk_level": "High" if any(f["severity"] == "high" for f in findings) else ("Medium" if findings else "Low"),
                         "fixes": ["Add input validation", "Sanitize user inputs"],
                         "best_practices": ["Use parameterized queries", "Validate all inputs"]
                     },
                     "timestamp": "2025-01-20T10:00:00Z"
                 }
-            ]
+            ],
+            "static_analysis": analysis
         }
     }
-    
-    # Cache the response
-    response_cache[code_hash] = response
-    return response
+
+def respond(payload: Dict, http_request: Request):
+    """Return msgpack when the client accepts it, plain JSON otherwise"""
+    if wants_msgpack(http_request.headers.get("accept")):
+        body, media_type = encode_payload(payload, binary=True)
+        return Response(content=body, media_type=media_type)
+    return payload
+
+async def shed_load(decision, code: str, analysis: Dict, cache_key, http_request: Request,
+                    compact: bool = False, run_id: str = None):
+    """Serve a request that was not admitted to the full workflow: cache, fast path or 429.
+
+    run_id is set when the run already reached the workflow (e.g. it timed
+    out), so the client can resume it from its checkpoints.
+    """
+    resume = {"runId": run_id} if run_id else {}
+    if decision.mode == "cache":
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            # Only the agent outputs are shared; everything else belongs to this request
+            result = {
+                "codebase": code,
+                "agent_outputs": cached["agent_outputs"],
+                "static_analysis": analysis,
+                "final_result": {}
+            }
+            if compact:
+                result = await asyncio.to_thread(compact_result, result)
+            response = {"success": True, "result": result, "degraded": decision.to_dict(),
+                        "message": "Served from an earlier review of the same code", **resume}
+            return respond(response, http_request)
+        decision = admission.fast_or_reject(decision.reason)
+    if decision.mode == "reject":
+        return JSONResponse(
+            status_code=429,
+            content={"success": False, "error": "Server overloaded", "message": "Please retry later", **resume},
+            headers={"Retry-After": str(decision.retry_after)}
+        )
+    # Local fast path, explicitly marked so clients don't mistake it for an agent review
+    return respond(dict(generate_fast_response(code, analysis), degraded=decision.to_dict(), **resume), http_request)
 
 @app.post("/process-code")
-async def process_code(request: dict):
+async def process_code(request: dict, http_request: Request):
     """Process code through the agent workflow"""
     
     print(f"Received request: {request}")  # Debug log
@@ -150,10 +297,32 @@ async def process_code(request: dict):
     
     code = request.get("code", "")
     task = request.get("task", "Improve this code")
+    # Compact mode deduplicates the state and sends diffs instead of repeated code
+    compact = wants_compact(request.get("compact", http_request.query_params.get("compact")))
+    # Sending the runId of an earlier attempt resumes it instead of starting over
+    run_id = request.get("runId") or str(uuid.uuid4())
+    
+    # Cheap local pre-analysis: trivial or broken input never reaches the agents
+    analysis = analyze_code(code)
+    if analysis["verdict"] == "reject":
+        return {
+            "success": False,
+            "error": analysis["reason"],
+            "message": "Code rejected by static analysis",
+            "static_analysis": analysis
+        }
     
     # Use fast response for demo
-    if code.strip():
-        return generate_fast_response(code)
+    if FAST_RESPONSE_MODE:
+        return respond(generate_fast_response(code, analysis), http_request)
+    
+    # Admission control: under load, lower priorities get cheaper answers instead of queueing
+    priority = request.get("priority", "normal")
+    # Exact text, not the fingerprint: cached agent outputs carry the code's comments
+    cache_key = ("workflow", content_hash(code), task)
+    decision = admission.decide(priority, cached=cache_key in response_cache)
+    if decision.mode not in ("full", "reduced"):
+        return await shed_load(decision, code, analysis, cache_key, http_request, compact)
     
     # Initialize state
     initial_state = AgentForgeState(
@@ -162,53 +331,205 @@ async def process_code(request: dict):
         agent_outputs=[],
         memory_context={},
         improvement_suggestions=[],
-        final_result={}
+        final_result={},
+        static_analysis=analysis,
+        verification={},
+        run_id=run_id,
+        cross_file_context=""
     )
+    reduced = decision.mode == "reduced"
     
-    try:
-        # Run the workflow
-        result = await workflow.ainvoke(initial_state)
+    async with admission.slot() as admitted:
+        if not admitted:
+            return await shed_load(admission.fast_or_reject("queue_timeout"), code, analysis, cache_key, http_request, compact)
         
-        # Store in memory with user context
-        memory_manager.store_code_pattern(code, "user_input", {
-            "task": task,
-            "userId": user_id,
-            "timestamp": "2025-01-20T10:00:00Z"
-        })
-        
-        # Store agent interactions with user context
-        for output in result["agent_outputs"]:
-            memory_manager.store_agent_interaction(
-                output["agent"],
-                {"code": code, "task": task, "userId": user_id},
-                output["output"]
+        try:
+            # Run the workflow
+            result = await asyncio.wait_for(
+                run_workflow(reduced_workflow if reduced else workflow, initial_state, resume=not reduced),
+                RUN_TIMEOUT
             )
-        
-        # Broadcast results to all connected WebSocket clients
-        for connection in manager.active_connections:
-            try:
-                await connection.send_text(json.dumps({
-                    "type": "processing_complete",
-                    "data": {
-                        "agent_outputs": result["agent_outputs"],
-                        "message": "Code processing completed"
-                    }
-                }))
-            except Exception as e:
-                print(f"Error sending to WebSocket: {e}")
-        
-        return {
-            "success": True,
-            "result": result,
-            "message": "Code processed successfully"
-        }
-        
+        except asyncio.TimeoutError:
+            admission.record_failure()
+            return await shed_load(admission.fast_or_reject("timeout"), code, analysis, cache_key, http_request, compact, run_id)
+        except Exception as e:
+            admission.record_failure()
+            return {
+                "success": False,
+                "error": str(e),
+                "runId": run_id,
+                "message": "Error processing code"
+            }
+    
+    admission.record_outcome(result["agent_outputs"])
+    
+    # Store in memory with user context
+    memory_manager.store_code_pattern(code, "user_input", {
+        "task": task,
+        "userId": user_id,
+        "functionFingerprints": function_fingerprints(code, analysis["language"]),
+        "timestamp": "2025-01-20T10:00:00Z"
+    })
+    
+    # Store agent interactions with user context
+    for output in result["agent_outputs"]:
+        memory_manager.store_agent_interaction(
+            output["agent"],
+            {"code": code, "task": task, "userId": user_id},
+            output["output"]
+        )
+    
+    # Broadcast results to all connected WebSocket clients
+    await manager.broadcast_result(result)
+    
+    response = {
+        "success": True,
+        "result": result,
+        "runId": run_id,
+        "message": "Code processed successfully"
+    }
+    if reduced:
+        response["degraded"] = decision.to_dict()
+    elif not any(output.get("fallback") for output in result["agent_outputs"]):
+        # Clean full runs can be served again when shedding load; keep just what is reusable
+        response_cache.set(cache_key, {"agent_outputs": result["agent_outputs"]})
+    
+    if compact:
+        response = dict(response, result=await asyncio.to_thread(compact_result, result))
+    return respond(response, http_request)
+
+async def run_workflow(graph, initial_state: AgentForgeState, resume: bool = True) -> Dict:
+    """Run a graph, resuming from checkpoints while agents fall back (traced when tracing is on)"""
+    tracer = get_tracer()
+    if tracer is None:
+        return await _run_workflow(graph, initial_state, resume)
+    with tracer.run(initial_state["run_id"], initial_state["codebase"], initial_state["current_task"]):
+        return await _run_workflow(graph, initial_state, resume)
+
+async def _run_workflow(graph, initial_state: AgentForgeState, resume: bool) -> Dict:
+    result = await graph.ainvoke(initial_state)
+    attempts = 0
+    while resume and checkpointer and attempts < AUTO_RESUME_ATTEMPTS and any(
+        output.get("fallback") for output in result["agent_outputs"]
+    ):
+        attempts += 1
+        print(f"Resuming run {initial_state['run_id']} after agent fallback (attempt {attempts})")
+        result = await graph.ainvoke(AgentForgeState(**{**initial_state, "agent_outputs": [], "final_result": {}}))
+    if resume and checkpointer and not any(output.get("fallback") for output in result["agent_outputs"]):
+        # Finished cleanly: nothing left to resume
+        checkpointer.clear(checkpoint_key(initial_state))
+    return result
+
+def load_repository(request: dict) -> Dict[str, str]:
+    """Sources of a repository request: {"files": {path: code}}, a base64 "archive" or a server "path" """
+    if request.get("files"):
+        return load_files(request["files"])
+    if request.get("archive"):
+        return load_archive(base64.b64decode(request["archive"]), request.get("filename", ""))
+    if request.get("path"):
+        if not REPO_ROOT:
+            raise ValueError("Reviewing server paths is disabled (set AGENTFORGE_REPO_ROOT)")
+        root = os.path.realpath(REPO_ROOT)
+        path = os.path.realpath(os.path.join(root, request["path"]))
+        if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+            raise ValueError("Path is not a directory under AGENTFORGE_REPO_ROOT")
+        return load_directory(path)
+    raise ValueError("Provide files, archive or path")
+
+@app.post("/process-repository")
+async def process_repository(request: dict, http_request: Request):
+    """Review a whole repository: one workflow per module, in dependency order"""
+    task = request.get("task", "Improve this code")
+    compact = wants_compact(request.get("compact", http_request.query_params.get("compact")))
+    run_id = request.get("runId") or str(uuid.uuid4())
+    concurrency = max(1, min(int(request.get("concurrency", REPO_MAX_CONCURRENCY)), REPO_MAX_CONCURRENCY))
+    
+    try:
+        sources = await asyncio.to_thread(load_repository, request)
     except Exception as e:
+        return {"success": False, "error": str(e), "message": "Could not load repository"}
+    if not sources:
+        return {"success": False, "error": "No supported source files", "message": "Could not load repository"}
+    
+    decision = admission.decide(request.get("priority", "normal"))
+    if decision.mode not in ("full", "reduced") and not FAST_RESPONSE_MODE:
+        # A repository is many runs; the cheap rungs of the ladder don't apply to it
+        return JSONResponse(
+            status_code=429,
+            content={"success": False, "error": "Server overloaded", "message": "Please retry later"},
+            headers={"Retry-After": str(decision.retry_after or max(1, int(admission.expected_wait())))}
+        )
+    graph = reduced_workflow if decision.mode == "reduced" else workflow
+    
+    async def run_module(path: str, code: str, cross_file_context: str) -> Dict:
+        analysis = analyze_code(code)
+        if analysis["verdict"] == "reject":
+            return {"skipped": analysis["reason"]}
+        if FAST_RESPONSE_MODE:
+            return dict(generate_fast_response(code, analysis)["result"], codebase=code)
+        initial_state = AgentForgeState(
+            codebase=code,
+            current_task=task,
+            agent_outputs=[],
+            memory_context={},
+            improvement_suggestions=[],
+            final_result={},
+            static_analysis=analysis,
+            verification={},
+            run_id=f"{run_id}:{path}",
+            cross_file_context=cross_file_context
+        )
+        # Modules share the global run slots with single-file requests
+        async with admission.slot() as admitted:
+            if not admitted:
+                return {"skipped": "queue_timeout"}
+            try:
+                result = await asyncio.wait_for(run_workflow(graph, initial_state, resume=graph is workflow), RUN_TIMEOUT)
+            except Exception:
+                admission.record_failure()
+                raise
+        admission.record_outcome(result["agent_outputs"])
+        return result
+    
+    async def review_with_index(index_dir: str):
+        index = SymbolIndex(index_dir)
+        try:
+            index_stats = await asyncio.to_thread(index.update, sources)
+            return index_stats, await review_repository(sources, index, run_module, concurrency)
+        finally:
+            index.close()
+    
+    # Re-submitting a repository under the same name only re-parses changed files;
+    # unnamed submissions can never be matched again, so their index is temporary
+    name = request.get("name") or request.get("path")
+    if name:
+        async with index_lock(os.path.join(REPO_INDEX_DIR, content_hash(name))) as index_dir:
+            index_stats, review = await review_with_index(index_dir)
+    else:
+        with tempfile.TemporaryDirectory(prefix="agentforge-index-") as index_dir:
+            index_stats, review = await review_with_index(index_dir)
+    
+    def module_results() -> Dict:
         return {
-            "success": False,
-            "error": str(e),
-            "message": "Error processing code"
+            path: compact_result(result) if compact and "agent_outputs" in result else result
+            for path, result in review["results"].items()
         }
+    modules = await asyncio.to_thread(module_results) if compact else module_results()
+    
+    response = {
+        "success": True,
+        "runId": run_id,
+        "index": index_stats,
+        "order": review["order"],
+        "dependencies": review["dependencies"],
+        "cyclesBroken": review["cycles_broken"],
+        "apiChanges": review["api_changes"],
+        "modules": modules,
+        "message": f"Reviewed {len(modules)} modules"
+    }
+    if decision.mode == "reduced":
+        response["degraded"] = decision.to_dict()
+    return respond(response, http_request)
 
 @app.get("/memory/patterns")
 async def get_memory_patterns(code: str = "", user_id: str = ""):
@@ -266,7 +587,9 @@ async def health_check():
         "status": "healthy",
         "agents": ["architect", "implementer", "tester", "security"],
         "memory": "connected",
-        "workflow": "ready"
+        "workflow": "ready",
+        "cache": response_cache.get_stats(),
+        "admission": admission.get_stats()
     }
 
 @app.get("/socket.io/")
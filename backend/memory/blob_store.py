@@ -0,0 +1,80 @@
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from transport.payloads import content_hash
+
+class BlobStore:
+    """Content-addressed store for code strings, so each distinct text is held once.
+
+    Keys are the same content hashes used by compact payloads ({"$ref": key}).
+    Long-lived holders (memory records) put(text, retain=True) the blobs
+    they reference and release() them when dropped; unreferenced blobs are
+    evicted least recently used once the store exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.blobs: "OrderedDict[str, str]" = OrderedDict()
+        self.refcounts: Dict[str, int] = {}
+        self.size = 0
+        self.deduplicated = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.blobs
+
+    def put(self, text: str, retain: bool = False) -> str:
+        key = content_hash(text)
+        if retain:
+            self.refcounts[key] = self.refcounts.get(key, 0) + 1
+        if key in self.blobs:
+            self.deduplicated += 1
+            self.blobs.move_to_end(key)
+            return key
+        self.blobs[key] = text
+        self.size += len(text)
+        self._evict()
+        return key
+
+    def get(self, key: str) -> Optional[str]:
+        text = self.blobs.get(key)
+        if text is not None:
+            self.blobs.move_to_end(key)
+        return text
+
+    def release(self, key: str) -> None:
+        count = self.refcounts.get(key, 0) - 1
+        if count > 0:
+            self.refcounts[key] = count
+        else:
+            self.refcounts.pop(key, None)
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.size <= self.max_bytes:
+            return
+        for key in list(self.blobs):
+            if self.size <= self.max_bytes:
+                break
+            if key not in self.refcounts:
+                self.size -= len(self.blobs.pop(key))
+
+    def ref(self, text: Any, retain: bool = False) -> Any:
+        """Store a string and return {"$ref": key}; other values pass through"""
+        return {"$ref": self.put(text, retain)} if isinstance(text, str) else text
+
+    def deref(self, value: Any) -> Any:
+        """Inverse of ref(); None when the blob was evicted"""
+        if isinstance(value, dict) and set(value) == {"$ref"}:
+            return self.get(value["$ref"])
+        return value
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "blobs": len(self.blobs),
+            "bytes": self.size,
+            "retained": len(self.refcounts),
+            "deduplicated": self.deduplicated
+        }
+
+# One store per process, shared by MemoryManager instances (workflow state and caches hold plain strings)
+blob_store = BlobStore(int(os.getenv("AGENTFORGE_BLOB_STORE_BYTES", str(64 * 1024 * 1024))))
@@ -2,6 +2,8 @@ import json
 import os
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+from analysis.fingerprint import function_fingerprints
+from .blob_store import blob_store
 
 class MemoryManager:
     def __init__(self):
@@ -17,7 +19,8 @@ class MemoryManager:
     def store_code_pattern(self, code: str, pattern_type: str, metadata: Dict[str, Any]) -> None:
         """Store a code pattern in memory"""
         pattern = {
-            "code": code,
+            # Code is kept once in the blob store, however many records mention it
+            "code": blob_store.ref(code, retain=True),
             "type": pattern_type,
             "metadata": metadata,
             "timestamp": datetime.now().isoformat()
@@ -26,10 +29,15 @@ class MemoryManager:
         
         # Keep only last 100 patterns to prevent memory bloat
         if len(self.memory_store["code_patterns"]) > 100:
+            self._release(self.memory_store["code_patterns"][:-100])
             self.memory_store["code_patterns"] = self.memory_store["code_patterns"][-100:]
     
     def store_agent_interaction(self, agent_name: str, context: Dict[str, Any], output: Dict[str, Any]) -> None:
         """Store an agent interaction in memory"""
+        if isinstance(context.get("code"), str):
+            context = dict(context, code=blob_store.ref(context["code"], retain=True))
+        if isinstance(output, dict) and isinstance(output.get("improved_code"), str):
+            output = dict(output, improved_code=blob_store.ref(output["improved_code"], retain=True))
         interaction = {
             "agent": agent_name,
             "context": context,
@@ -40,16 +48,45 @@ class MemoryManager:
         
         # Keep only last 200 interactions
         if len(self.memory_store["agent_interactions"]) > 200:
+            self._release(self.memory_store["agent_interactions"][:-200])
             self.memory_store["agent_interactions"] = self.memory_store["agent_interactions"][-200:]
     
+    @staticmethod
+    def _code_refs(record: Dict[str, Any]) -> List[Any]:
+        output = record.get("output")
+        return [
+            record.get("code"),
+            record.get("context", {}).get("code"),
+            output.get("improved_code") if isinstance(output, dict) else None
+        ]
+    
+    def _release(self, records: List[Dict[str, Any]]) -> None:
+        for record in records:
+            for value in self._code_refs(record):
+                if isinstance(value, dict) and "$ref" in value:
+                    blob_store.release(value["$ref"])
+    
+    @staticmethod
+    def _resolve(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a record with code references replaced by the code"""
+        record = dict(record)
+        if "code" in record:
+            record["code"] = blob_store.deref(record["code"])
+        if isinstance(record.get("context"), dict) and "code" in record["context"]:
+            record["context"] = dict(record["context"], code=blob_store.deref(record["context"]["code"]))
+        if isinstance(record.get("output"), dict) and "improved_code" in record["output"]:
+            record["output"] = dict(record["output"], improved_code=blob_store.deref(record["output"]["improved_code"]))
+        return record
+    
     def find_similar_patterns(self, code: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Find similar code patterns using simple text matching"""
         similar_patterns = []
+        fingerprints = set(function_fingerprints(code).values())
         
         for pattern in self.memory_store["code_patterns"]:
             # Simple similarity check based on function/class names
             code_lower = code.lower()
-            pattern_lower = pattern["code"].lower()
+            pattern_lower = (blob_store.deref(pattern["code"]) or "").lower()
             
             # Check for common keywords
             common_keywords = ["function", "class", "def", "const", "let", "var", "import", "export"]
@@ -59,6 +96,10 @@ class MemoryManager:
                 if keyword in code_lower and keyword in pattern_lower:
                     similarity_score += 1
             
+            # Functions that are identical up to formatting weigh far more than shared keywords
+            shared = fingerprints & set(pattern["metadata"].get("functionFingerprints", {}).values())
+            similarity_score += 10 * len(shared)
+            
             if similarity_score > 0:
                 similar_patterns.append({
                     "pattern": pattern,
@@ -67,7 +108,7 @@ class MemoryManager:
         
         # Sort by similarity and return top matches
         similar_patterns.sort(key=lambda x: x["similarity"], reverse=True)
-        return [p["pattern"] for p in similar_patterns[:limit]]
+        return [self._resolve(p["pattern"]) for p in similar_patterns[:limit]]
     
     def get_agent_history(self, agent_name: str, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get interaction history for a specific agent"""
@@ -79,7 +120,7 @@ class MemoryManager:
                 if user_id is None or interaction["context"].get("userId") == user_id:
                     history.append(interaction)
         
-        return history[-50:]  # Return last 50 interactions
+        return [self._resolve(interaction) for interaction in history[-50:]]  # Return last 50 interactions
     
     def get_memory_stats(self) -> Dict[str, Any]:
         """Get memory statistics"""
@@ -87,11 +128,13 @@ class MemoryManager:
             "total_patterns": len(self.memory_store["code_patterns"]),
             "total_interactions": len(self.memory_store["agent_interactions"]),
             "total_improvements": len(self.memory_store["improvements"]),
-            "storage_type": "in-memory"
+            "storage_type": "in-memory",
+            "blob_store": blob_store.get_stats()
         }
     
     def clear_memory(self) -> None:
         """Clear all memory (useful for testing)"""
+        self._release(self.memory_store["code_patterns"] + self.memory_store["agent_interactions"])
         self.memory_store = {
             "code_patterns": [],
             "agent_interactions": [],
@@ -0,0 +1 @@
+# Repository package
\ No newline at end of file
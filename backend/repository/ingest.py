@@ -0,0 +1,97 @@
+# backend/repository/ingest.py
+import io
+import os
+import posixpath
+import tarfile
+import zipfile
+from typing import Dict, Optional
+
+SOURCE_EXTENSIONS = (".py", ".js", ".jsx", ".mjs", ".ts", ".tsx")
+SKIPPED_DIRS = {".git", ".hg", "node_modules", "__pycache__", "venv", ".venv", "env", "dist", "build", ".tox", ".mypy_cache"}
+
+# Generated bundles and vendored blobs are not worth an agent run
+MAX_FILE_BYTES = int(os.getenv("AGENTFORGE_REPO_MAX_FILE_BYTES", str(200 * 1024)))
+MAX_FILES = int(os.getenv("AGENTFORGE_REPO_MAX_FILES", "2000"))
+
+def _wanted(path: str) -> bool:
+    parts = path.split("/")
+    if any(part in SKIPPED_DIRS or part.startswith(".") for part in parts[:-1]):
+        return False
+    return path.endswith(SOURCE_EXTENSIONS) and not path.endswith(".min.js")
+
+def _normalize(name: str) -> Optional[str]:
+    # Archive member names are untrusted: no absolute paths or parent references
+    path = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    if path.startswith("..") or path == ".":
+        return None
+    return path
+
+def _decode(data: bytes) -> Optional[str]:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+def _strip_common_root(sources: Dict[str, str]) -> Dict[str, str]:
+    # Archives usually wrap everything in one top-level folder (project-main/...)
+    roots = {path.split("/", 1)[0] for path in sources}
+    if len(roots) == 1 and all("/" in path for path in sources):
+        return {path.split("/", 1)[1]: code for path, code in sources.items()}
+    return sources
+
+def load_directory(root: str) -> Dict[str, str]:
+    """Read source files under root, keyed by POSIX path relative to root"""
+    sources = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIPPED_DIRS and not d.startswith("."))
+        for filename in sorted(filenames):
+            full = os.path.join(dirpath, filename)
+            path = os.path.relpath(full, root).replace(os.sep, "/")
+            if not _wanted(path) or os.path.getsize(full) > MAX_FILE_BYTES:
+                continue
+            with open(full, "rb") as f:
+                code = _decode(f.read())
+            if code is not None:
+                sources[path] = code
+                if len(sources) >= MAX_FILES:
+                    return sources
+    return sources
+
+def load_archive(data: bytes, filename: str = "") -> Dict[str, str]:
+    """Read source files from a zip or tar(.gz/.bz2/.xz) archive in memory, without extracting to disk"""
+    sources = {}
+    if filename.endswith(".zip") or zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                path = _normalize(info.filename)
+                if info.is_dir() or path is None or not _wanted(path) or info.file_size > MAX_FILE_BYTES:
+                    continue
+                code = _decode(archive.read(info))
+                if code is not None:
+                    sources[path] = code
+                if len(sources) >= MAX_FILES:
+                    break
+    else:
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as archive:
+            for member in archive:
+                path = _normalize(member.name)
+                if not member.isfile() or path is None or not _wanted(path) or member.size > MAX_FILE_BYTES:
+                    continue
+                code = _decode(archive.extractfile(member).read())
+                if code is not None:
+                    sources[path] = code
+                if len(sources) >= MAX_FILES:
+                    break
+    return _strip_common_root(sources)
+
+def load_files(files: Dict[str, str]) -> Dict[str, str]:
+    """Filter an uploaded {path: code} mapping the same way as directories and archives"""
+    sources = {}
+    for name, code in files.items():
+        path = _normalize(name)
+        if path is None or not isinstance(code, str) or not _wanted(path) or len(code.encode()) > MAX_FILE_BYTES:
+            continue
+        sources[path] = code
+        if len(sources) >= MAX_FILES:
+            break
+    return sources
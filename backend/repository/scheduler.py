@@ -0,0 +1,86 @@
+# backend/repository/scheduler.py
+import asyncio
+from typing import Dict, Any, List, Tuple, Callable, Awaitable
+from workflow.agent_workflow import improved_code_of
+from .symbol_index import SymbolIndex, extract_symbols
+
+def dependency_order(graph: Dict[str, List[str]]) -> Tuple[List[str], int]:
+    """Modules ordered so dependencies come first; returns (order, import cycles broken).
+
+    Within a cycle there is no right order, so the member with the fewest
+    unreviewed dependencies goes first.
+    """
+    remaining = {path: set(deps) for path, deps in graph.items()}
+    dependents: Dict[str, List[str]] = {path: [] for path in graph}
+    for path, deps in graph.items():
+        for dep in deps:
+            dependents[dep].append(path)
+
+    order, cycles = [], 0
+    ready = sorted(path for path, deps in remaining.items() if not deps)
+    while remaining:
+        if not ready:
+            cycles += 1
+            ready = [min(remaining, key=lambda path: (len(remaining[path]), path))]
+        path = ready.pop(0)
+        if path not in remaining:
+            continue
+        del remaining[path]
+        order.append(path)
+        for dependent in dependents[path]:
+            if dependent in remaining:
+                remaining[dependent].discard(path)
+                if not remaining[dependent]:
+                    ready.append(dependent)
+    return order, cycles
+
+def _changed_signatures(path: str, original: str, improved: str) -> Dict[str, str]:
+    # Symbols whose signature the review rewrote, so dependents see the new API
+    if not improved or improved == original:
+        return {}
+    before = {s["name"]: s["signature"] for s in extract_symbols(path, original)["symbols"]}
+    after = {s["name"]: s["signature"] for s in extract_symbols(path, improved)["symbols"]}
+    return {name: signature for name, signature in after.items() if name in before and before[name] != signature}
+
+async def review_repository(sources: Dict[str, str], index: SymbolIndex,
+                            run_module: Callable[[str, str, str], Awaitable[Dict[str, Any]]],
+                            concurrency: int = 4) -> Dict[str, Any]:
+    """Run one workflow per module, dependencies first, at most `concurrency` at a time.
+
+    run_module(path, code, cross_file_context) returns the module's final
+    state. A module starts as soon as all of its dependencies are done, so
+    independent parts of the tree proceed in parallel.
+    """
+    graph = index.dependency_graph(list(sources))
+    order, cycles = dependency_order(graph)
+    done = {path: asyncio.Event() for path in order}
+    position = {path: i for i, path in enumerate(order)}
+    semaphore = asyncio.Semaphore(concurrency)
+    results: Dict[str, Dict[str, Any]] = {}
+    changed: Dict[str, Dict[str, str]] = {}
+
+    async def review(path: str):
+        try:
+            # Dependencies later in the order are cycle members; don't wait on them
+            await asyncio.gather(*(done[dep].wait() for dep in graph[path] if position[dep] < position[path]))
+            async with semaphore:
+                context = index.context_for(path, sources[path], changed)
+                result = await run_module(path, sources[path], context)
+            results[path] = result
+            if result.get("agent_outputs"):
+                api_changes = _changed_signatures(path, sources[path], improved_code_of(result))
+                if api_changes:
+                    changed[path] = api_changes
+        except Exception as e:
+            results[path] = {"error": str(e) or type(e).__name__}
+        finally:
+            done[path].set()
+
+    await asyncio.gather(*(review(path) for path in order))
+    return {
+        "order": order,
+        "dependencies": graph,
+        "cycles_broken": cycles,
+        "results": results,
+        "api_changes": changed
+    }
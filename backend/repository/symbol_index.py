@@ -0,0 +1,342 @@
+# backend/repository/symbol_index.py
+import ast
+import json
+import mmap
+import os
+import posixpath
+import re
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from analysis.static_analyzer import tokenize_js, detect_language
+from transport.payloads import content_hash
+
+JS_EXTENSIONS = (".js", ".jsx", ".mjs", ".ts", ".tsx")
+
+def module_name(path: str) -> str:
+    """Dotted module name of a Python file (pkg/mod.py -> pkg.mod, pkg/__init__.py -> pkg)"""
+    name = path[:-3] if path.endswith(".py") else path
+    if name.endswith("/__init__"):
+        name = name[:-len("/__init__")]
+    return name.replace("/", ".")
+
+def _language(path: str, code: str) -> str:
+    if path.endswith(".py"):
+        return "python"
+    if path.endswith((".ts", ".tsx")):
+        return "typescript"
+    if path.endswith(JS_EXTENSIONS):
+        return "javascript"
+    return detect_language(code)
+
+def _python_symbols(path: str, code: str) -> Tuple[List[Dict[str, Any]], List[List[Any]]]:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return [], []
+    package = module_name(path) if path.endswith("__init__.py") else module_name(path).rpartition(".")[0]
+
+    def signature(node) -> str:
+        prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+        return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+    symbols, imports = [], []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append({"name": node.name, "kind": "function", "signature": signature(node)})
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(base) for base in node.bases)
+            symbols.append({"name": node.name, "kind": "class", "signature": f"class {node.name}({bases})" if bases else f"class {node.name}"})
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and (not item.name.startswith("_") or item.name == "__init__"):
+                    symbols.append({"name": f"{node.name}.{item.name}", "kind": "method", "signature": signature(item)})
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name) and target.id.isupper():
+                    symbols.append({"name": target.id, "kind": "constant", "signature": target.id})
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend([alias.name, []] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ""
+            if node.level:
+                # Relative import: climb from this file's package
+                base = package.split(".") if package else []
+                base = base[:len(base) - (node.level - 1)] if node.level > 1 else base
+                module = ".".join(part for part in base + [module] if part)
+            imports.append([module, [alias.name for alias in node.names if alias.name != "*"]])
+    return symbols, imports
+
+def _js_params(tokens: List[str], start: int) -> Tuple[str, int]:
+    # tokens[start] is "("; return the parameter text and the index after ")"
+    depth, i, parts = 0, start, []
+    while i < len(tokens):
+        token = tokens[i]
+        depth += {"(": 1, ")": -1}.get(token, 0)
+        i += 1
+        if depth == 0:
+            break
+        if i - 1 > start:
+            parts.append(token + (" " if token in (",", ":") else ""))
+    return "".join(parts).strip(), i
+
+def _js_symbols(code: str) -> Tuple[List[Dict[str, Any]], List[List[Any]]]:
+    symbols, imports = [], []
+    tokens = [value for _, value in tokenize_js(code)]
+    depth = 0
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ("{", "}"):
+            depth += 1 if token == "{" else -1
+        elif depth == 0 and token == "function":
+            j = i + 1 + (tokens[i + 1:i + 2] == ["*"])
+            if j + 1 < len(tokens) and tokens[j + 1] == "(":
+                params, end = _js_params(tokens, j + 1)
+                symbols.append({"name": tokens[j], "kind": "function", "signature": f"function {tokens[j]}({params})"})
+                i = end
+                continue
+        elif depth == 0 and token == "class" and i + 1 < len(tokens):
+            signature = f"class {tokens[i + 1]}"
+            if tokens[i + 2:i + 3] == ["extends"] and i + 3 < len(tokens):
+                signature += f" extends {tokens[i + 3]}"
+            symbols.append({"name": tokens[i + 1], "kind": "class", "signature": signature})
+        elif depth == 0 and token in ("const", "let", "var") and tokens[i + 2:i + 3] == ["="]:
+            name, j = tokens[i + 1], i + 3
+            if tokens[j:j + 1] == ["async"]:
+                j += 1
+            is_function = tokens[j:j + 1] == ["function"]
+            if is_function:
+                # Skip the keyword and the name of a named function expression
+                j += 1 if tokens[j + 1:j + 2] == ["("] else 2
+            if tokens[j:j + 1] == ["("]:
+                params, end = _js_params(tokens, j)
+                if is_function or tokens[end:end + 1] == ["=>"]:
+                    signature = f"const {name} = function({params})" if is_function else f"const {name} = ({params}) =>"
+                    symbols.append({"name": name, "kind": "function", "signature": signature})
+                    i = end
+                    continue
+            elif name.isupper():
+                symbols.append({"name": name, "kind": "constant", "signature": name})
+        if (token == "import" or (token == "export" and tokens[i + 1:i + 2] in (["{"], ["*"]))) and i + 1 < len(tokens):
+            # import x from 'm' / import {a, b} from 'm' / export {a} from 'm' / import 'm'
+            j, names = i + 1, []
+            while j < len(tokens) and tokens[j] not in ("from", ";") and not tokens[j].startswith(("'", '"')):
+                if re.match(r"^[A-Za-z_$][\w$]*$", tokens[j]) and tokens[j] not in ("type", "as", "default", "import", "export"):
+                    names.append(tokens[j])
+                j += 1
+            if tokens[j:j + 1] == ["from"]:
+                j += 1
+            if j < len(tokens) and tokens[j][:1] in ("'", '"'):
+                imports.append([tokens[j][1:-1], names])
+        elif token == "require" and tokens[i + 1:i + 2] == ["("] and i + 2 < len(tokens) and tokens[i + 2][:1] in ("'", '"'):
+            imports.append([tokens[i + 2][1:-1], []])
+        i += 1
+    return symbols, imports
+
+def extract_symbols(path: str, code: str) -> Dict[str, Any]:
+    """Top-level signatures and raw import specs ([module, [names]]) of one file"""
+    language = _language(path, code)
+    if language == "python":
+        symbols, imports = _python_symbols(path, code)
+    elif language in ("javascript", "typescript"):
+        symbols, imports = _js_symbols(code)
+    else:
+        symbols, imports = [], []
+    return {"language": language, "symbols": symbols, "imports": imports}
+
+class SymbolIndex:
+    """Incremental on-disk index of a repository's symbols and imports.
+
+    The manifest (manifest.json) holds per-file hashes, languages and import
+    specs, which is all dependency ordering needs. Signatures live in a data
+    file of concatenated JSON records that is memory-mapped, so only the
+    records of a module's dependencies are decoded. update() re-parses only
+    files whose content hash changed.
+    """
+
+    def __init__(self, directory: str, max_cached_entries: int = 256):
+        self.directory = directory
+        self.max_cached_entries = max_cached_entries
+        os.makedirs(directory, exist_ok=True)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.generation = 0
+        self._mmap: Optional[mmap.mmap] = None
+        self._data_file = None
+        self._entries: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._modules: Dict[str, str] = {}
+        self._load()
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def _data_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"symbols-{generation}.dat")
+
+    def _load(self) -> None:
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.files = manifest["files"]
+            self.generation = manifest["generation"]
+        self._open_data()
+        self._build_module_map()
+
+    def _open_data(self) -> None:
+        self.close()
+        path = self._data_path(self.generation)
+        if self.files and os.path.exists(path) and os.path.getsize(path):
+            self._data_file = open(path, "rb")
+            self._mmap = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _build_module_map(self) -> None:
+        # Python files are importable by full dotted path and by any suffix of it
+        # (src/pkg/mod.py is usually imported as pkg.mod); full paths win
+        self._modules = {}
+        for path in sorted(self.files, key=lambda p: p.count("/")):
+            if self.files[path]["language"] != "python":
+                continue
+            parts = module_name(path).split(".")
+            for start in range(len(parts)):
+                self._modules.setdefault(".".join(parts[start:]), path)
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._data_file.close()
+            self._mmap = self._data_file = None
+        self._entries.clear()
+
+    def _raw(self, path: str) -> bytes:
+        meta = self.files[path]
+        return self._mmap[meta["offset"]:meta["offset"] + meta["length"]]
+
+    def update(self, sources: Dict[str, str]) -> Dict[str, int]:
+        """Bring the index in line with sources; returns how many files were parsed, reused and removed"""
+        generation = self.generation + 1
+        files, parsed, reused = {}, 0, 0
+        offset = 0
+        with open(self._data_path(generation), "wb") as out:
+            for path in sorted(sources):
+                sha = content_hash(sources[path])
+                old = self.files.get(path)
+                if old is not None and old["sha"] == sha and self._mmap is not None:
+                    record = self._raw(path)
+                    meta = dict(old)
+                    reused += 1
+                else:
+                    extracted = extract_symbols(path, sources[path])
+                    record = json.dumps(extracted["symbols"], separators=(",", ":")).encode()
+                    meta = {"sha": sha, "language": extracted["language"], "imports": extracted["imports"]}
+                    parsed += 1
+                out.write(record)
+                meta.update(offset=offset, length=len(record))
+                files[path] = meta
+                offset += len(record)
+
+        removed = len(set(self.files) - set(sources))
+        previous = self._data_path(self.generation)
+        manifest_tmp = self._manifest_path + ".tmp"
+        with open(manifest_tmp, "w", encoding="utf-8") as f:
+            json.dump({"generation": generation, "files": files}, f, separators=(",", ":"))
+        # The manifest names its data file, so a crash before this point keeps the old index intact
+        os.replace(manifest_tmp, self._manifest_path)
+
+        self.files, self.generation = files, generation
+        self._open_data()
+        self._build_module_map()
+        if os.path.exists(previous) and previous != self._data_path(generation):
+            os.remove(previous)
+        return {"files": len(files), "parsed": parsed, "reused": reused, "removed": removed}
+
+    def symbols(self, path: str) -> List[Dict[str, Any]]:
+        """Signatures of one file, decoded from the mapped data file on demand"""
+        if path in self._entries:
+            self._entries.move_to_end(path)
+            return self._entries[path]
+        if path not in self.files or self._mmap is None:
+            return []
+        entry = json.loads(self._raw(path))
+        self._entries[path] = entry
+        while len(self._entries) > self.max_cached_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def _resolve(self, path: str, spec: str, names: List[str]) -> List[Tuple[str, List[str]]]:
+        """Repository files an import spec refers to, with the names it imports from each"""
+        if self.files[path]["language"] == "python":
+            resolved = []
+            remaining = []
+            for name in names:
+                # from pkg import module imports a submodule, not a symbol
+                target = self._modules.get(f"{spec}.{name}" if spec else name)
+                if target and target != path:
+                    resolved.append((target, []))
+                else:
+                    remaining.append(name)
+            target = self._modules.get(spec)
+            if target and target != path and (remaining or not names):
+                resolved.append((target, remaining))
+            return resolved
+
+        if not spec.startswith("."):
+            return []  # npm package, not part of the repository
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(path), spec))
+        candidates = [base] + [base + ext for ext in JS_EXTENSIONS] + [f"{base}/index{ext}" for ext in JS_EXTENSIONS]
+        for candidate in candidates:
+            if candidate in self.files and candidate != path:
+                return [(candidate, names)]
+        return []
+
+    def imports_of(self, path: str) -> Dict[str, List[str]]:
+        """Internal dependencies of a file: {dependency path: imported names (empty = whole module)}"""
+        dependencies: Dict[str, List[str]] = {}
+        for spec, names in self.files.get(path, {}).get("imports", []):
+            for target, imported in self._resolve(path, spec, names):
+                current = dependencies.setdefault(target, [])
+                current.extend(name for name in imported if name not in current)
+        return dependencies
+
+    def dependency_graph(self, paths: Optional[List[str]] = None) -> Dict[str, List[str]]:
+        paths = set(paths if paths is not None else self.files)
+        return {path: sorted(dep for dep in self.imports_of(path) if dep in paths) for path in sorted(paths)}
+
+    def context_for(self, path: str, code: str, changed: Optional[Dict[str, Dict[str, str]]] = None,
+                    max_chars: int = 4000) -> str:
+        """Signatures from this file's dependencies that it actually uses, for the agents' prompt.
+
+        changed maps dependency paths to {symbol: reviewed signature} for
+        dependencies whose review already rewrote part of their API.
+        """
+        changed = changed or {}
+        words = set(re.findall(r"[A-Za-z_$][\w$]*", code))
+        sections = []
+        for dependency, names in sorted(self.imports_of(path).items()):
+            wanted = set(names) if names else words
+            lines = []
+            for symbol in self.symbols(dependency):
+                owner = symbol["name"].split(".", 1)[0]
+                if owner not in wanted and symbol["name"] not in wanted:
+                    continue
+                line = ("    " if symbol["kind"] == "method" else "") + symbol["signature"]
+                reviewed = changed.get(dependency, {}).get(symbol["name"])
+                if reviewed:
+                    line += f"    # reviewed version: {reviewed}"
+                lines.append(line)
+            if lines:
+                sections.append(f"# {dependency}\n" + "\n".join(lines))
+
+        context = "\n".join(sections)
+        if len(context) > max_chars:
+            context = context[:max_chars].rsplit("\n", 1)[0] + "\n# ... more signatures omitted"
+        return context
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self.files),
+            "generation": self.generation,
+            "data_bytes": self._mmap.size() if self._mmap is not None else 0
+        }
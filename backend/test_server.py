@@ -69,7 +69,10 @@ async def test_simple_workflow():
             "agent_outputs": [],
             "memory_context": {},
             "improvement_suggestions": [],
-            "final_result": {}
+            "final_result": {},
+            "static_analysis": {},
+            "verification": {},
+            "cross_file_context": ""
         }
         
         # Run workflow
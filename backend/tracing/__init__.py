@@ -0,0 +1 @@
+# Tracing package
\ No newline at end of file
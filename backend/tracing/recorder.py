@@ -0,0 +1,143 @@
+# backend/tracing/recorder.py
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+REDACT_MODES = ("none", "code", "all")
+
+# Run being traced in the current task (propagates into worker threads that copy the context)
+_current_run: contextvars.ContextVar = contextvars.ContextVar("agentforge_trace_run", default=None)
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+def _placeholder(text: str) -> str:
+    return f"<redacted {len(text)} chars sha:{_sha(text)}>"
+
+def _redact_strings(value: Any) -> Any:
+    if isinstance(value, str):
+        return _placeholder(value)
+    if isinstance(value, list):
+        return [_redact_strings(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _redact_strings(v) for k, v in value.items()}
+    return value
+
+class TraceRecorder:
+    """Appends model calls and node transitions of workflow runs to a JSON-lines file.
+
+    Redaction modes: "none" keeps everything; "code" replaces the submitted
+    code in prompts and `improved_code` in responses with placeholders;
+    "all" keeps only sizes, hashes and the JSON shape of responses.
+    """
+
+    def __init__(self, path: str, redact: str = "code"):
+        if redact not in REDACT_MODES:
+            raise ValueError(f"Unknown redaction mode {redact!r}, expected one of {REDACT_MODES}")
+        self.path = path
+        self.redact = redact
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def from_env(cls) -> Optional["TraceRecorder"]:
+        """Tracing is opt-in: set AGENTFORGE_TRACE_FILE (and optionally AGENTFORGE_TRACE_REDACT)"""
+        path = os.getenv("AGENTFORGE_TRACE_FILE")
+        if not path:
+            return None
+        return cls(path, os.getenv("AGENTFORGE_TRACE_REDACT", "code"))
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def _redact_code(self, text: str) -> str:
+        if self.redact == "none":
+            return text
+        if self.redact == "all":
+            return _placeholder(text)
+        run = _current_run.get()
+        for code in (run or {}).get("code", ()):
+            if code:
+                text = text.replace(code, _placeholder(code))
+        return text
+
+    def _redact_response(self, text: str) -> str:
+        if self.redact == "none":
+            return text
+        body = text.strip()
+        if body.startswith("```"):
+            body = body.split("\n", 1)[1] if "\n" in body else ""
+            body = body.rsplit("```", 1)[0]
+        try:
+            parsed = json.loads(body)
+        except ValueError:
+            return _placeholder(text)
+        if self.redact == "all":
+            parsed = _redact_strings(parsed)
+        elif isinstance(parsed, dict) and isinstance(parsed.get("improved_code"), str):
+            run = _current_run.get()
+            if run is not None:
+                # Later prompts embed the rewritten code; redact it there too
+                run["code"].append(parsed["improved_code"])
+            parsed["improved_code"] = _placeholder(parsed["improved_code"])
+        return json.dumps(parsed)
+
+    @contextmanager
+    def run(self, run_id: str, code: str, task: str):
+        """Scope a workflow run: model calls and nodes inside it are tagged with run_id"""
+        token = _current_run.set({"run_id": run_id, "code": [code]})
+        started = time.time()
+        self._write({
+            "type": "run_start", "run_id": run_id, "ts": started,
+            "code": self._redact_code(code), "code_chars": len(code), "task": task
+        })
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            self._write({"type": "run_end", "run_id": run_id, "ts": time.time(), "duration": time.time() - started, "error": error})
+            _current_run.reset(token)
+
+    def record_model_call(self, agent: str, model: Optional[str], prompt: str, response: Optional[str],
+                          latency: float, error: Optional[str] = None, stream: bool = False) -> None:
+        run = _current_run.get() or {}
+        self._write({
+            "type": "model_call", "run_id": run.get("run_id"), "ts": time.time(),
+            "agent": agent, "model": model, "stream": stream,
+            "prompt": self._redact_code(prompt), "prompt_chars": len(prompt), "prompt_sha": _sha(prompt),
+            "response": self._redact_response(response) if response is not None else None,
+            "response_chars": len(response or ""), "latency": round(latency, 4), "error": error
+        })
+
+    def record_node(self, node: str, duration: float, update: Dict[str, Any], skipped: bool = False) -> None:
+        run = _current_run.get() or {}
+        self._write({
+            "type": "node", "run_id": run.get("run_id"), "ts": time.time(), "node": node,
+            "duration": round(duration, 4), "skipped": skipped,
+            "update_bytes": len(json.dumps(update, default=str))
+        })
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+tracer = TraceRecorder.from_env()
+
+def get_tracer() -> Optional[TraceRecorder]:
+    return tracer
+
+def set_tracer(recorder: Optional[TraceRecorder]) -> None:
+    """Install (or remove with None) the process-wide recorder"""
+    global tracer
+    tracer = recorder
@@ -0,0 +1,255 @@
+# backend/tracing/replay.py
+"""Replay recorded workflow runs against the current code with recorded model responses.
+
+Usage (from backend/):
+    python -m tracing.replay trace.jsonl [--concurrency N] [--speed X] [--arrivals] [--profile]
+
+Model calls return their recorded responses after their recorded latency
+(divided by --speed), so the run exercises the real graph, analysis,
+sandbox and caching code with production-shaped timing but no provider.
+Runs need the submitted code, i.e. traces recorded with
+AGENTFORGE_TRACE_REDACT=none; with "code" redaction the improved code
+in responses is a placeholder, which downstream nodes see as such.
+Replay never reaches the provider: runs recorded from agent-cache hits
+have no calls and are skipped, and a call without a recorded response
+fails (and marks the run incomplete) instead of going live.
+"""
+import argparse
+import asyncio
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional
+from .recorder import TraceRecorder, _sha, set_tracer
+
+def load_trace(path: str) -> Dict[str, Dict[str, Any]]:
+    """Group trace records by run: {run_id: {start, end, calls, nodes}} in file order"""
+    runs: Dict[str, Dict[str, Any]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            run_id = record.get("run_id")
+            if run_id is None:
+                continue
+            run = runs.setdefault(run_id, {"start": None, "end": None, "calls": [], "nodes": []})
+            kind = record.get("type")
+            if kind == "run_start":
+                # A resumed run (same run ID) keeps its first start
+                run["start"] = run["start"] or record
+            elif kind == "run_end":
+                run["end"] = record
+            elif kind == "model_call":
+                run["calls"].append(record)
+            elif kind == "node":
+                run["nodes"].append(record)
+    return runs
+
+class ReplayModel:
+    """Stands in for a GenerativeModel and answers with recorded responses.
+
+    Calls are matched by prompt hash first, then in recorded order, so a
+    replay still works when prompt wording has changed since recording.
+    """
+
+    def __init__(self, model_name: str, calls: List[Dict[str, Any]], speed: float = 1.0):
+        self.model_name = model_name
+        self.calls = list(calls)
+        self.speed = speed
+        self.unmatched = 0
+        # Calls the trace had no response for (the agent was a cache hit when recorded)
+        self.missing = 0
+        self._lock = threading.Lock()
+
+    def _next_call(self, prompt: str) -> Dict[str, Any]:
+        sha = _sha(prompt)
+        with self._lock:
+            for i, call in enumerate(self.calls):
+                if call.get("prompt_sha") == sha:
+                    return self.calls.pop(i)
+            if not self.calls:
+                self.missing += 1
+                raise RuntimeError(f"No recorded response left for {self.model_name}")
+            self.unmatched += 1
+            return self.calls.pop(0)
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        call = self._next_call(prompt)
+        delay = call.get("latency", 0.0) / self.speed if self.speed > 0 else 0.0
+        if call.get("error") or call.get("response") is None:
+            time.sleep(delay)
+            raise RuntimeError(call.get("error") or "recorded call had no response")
+        text = call["response"]
+        if not stream:
+            time.sleep(delay)
+            return SimpleNamespace(text=text)
+        return self._stream(text, delay)
+
+    def _stream(self, text: str, delay: float, chunk_size: int = 64):
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield SimpleNamespace(text=chunk)
+
+class _CollectingRecorder(TraceRecorder):
+    """Recorder that keeps records in memory so replayed timings can be compared"""
+
+    def __init__(self):
+        self.path = None
+        self.redact = "all"
+        self._lock = threading.Lock()
+        self.records: List[Dict[str, Any]] = []
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    def close(self) -> None:
+        pass
+
+def replay_models(run: Dict[str, Any], speed: float) -> Dict[str, ReplayModel]:
+    """A ReplayModel for every agent, so none can fall through to the live provider"""
+    from workflow.agent_workflow import AGENT_NAMES
+
+    by_agent = defaultdict(list)
+    for call in run["calls"]:
+        by_agent[call["agent"]].append(call)
+    models = {}
+    for agent in set(AGENT_NAMES) | set(by_agent):
+        calls = by_agent.get(agent, [])
+        models[agent] = ReplayModel(calls[0].get("model") if calls else "replay", calls, speed)
+    return models
+
+def _node_durations(records: List[Dict[str, Any]]) -> Dict[str, List[float]]:
+    durations = defaultdict(list)
+    for record in records:
+        if record.get("type") == "node" and not record.get("skipped"):
+            durations[record["node"]].append(record["duration"])
+    return durations
+
+async def replay_runs(runs: Dict[str, Dict[str, Any]], concurrency: int = 4, speed: float = 1.0,
+                      arrivals: bool = False, use_cache: bool = False) -> Dict[str, Any]:
+    """Re-run recorded runs through the workflow and compare timings with the recording"""
+    from workflow.agent_workflow import create_agent_forge_workflow, AgentForgeState, agent_cache
+
+    unredacted = {
+        run_id: run for run_id, run in runs.items()
+        if run["start"] and not run["start"]["code"].startswith("<redacted")
+    }
+    # Runs served from the agent cache made no model calls; there is nothing to replay them with
+    replayable = {run_id: run for run_id, run in unredacted.items() if run["calls"]}
+    if not use_cache:
+        # Otherwise repeated code in the trace would skip model calls the recording made
+        agent_cache.entries.clear()
+
+    recorder = _CollectingRecorder()
+    set_tracer(recorder)
+    semaphore = asyncio.Semaphore(concurrency)
+    first_ts = min((run["start"]["ts"] for run in replayable.values()), default=0.0)
+    results = {}
+
+    async def replay_one(run_id: str, run: Dict[str, Any]):
+        if arrivals:
+            # Preserve the recorded inter-arrival times (scaled by speed)
+            await asyncio.sleep((run["start"]["ts"] - first_ts) / speed)
+        async with semaphore:
+            models = replay_models(run, speed)
+            graph = create_agent_forge_workflow(models=models)
+            state = AgentForgeState(
+                codebase=run["start"]["code"],
+                current_task=run["start"].get("task", ""),
+                agent_outputs=[],
+                memory_context={},
+                improvement_suggestions=[],
+                final_result={},
+                static_analysis={},
+                verification={},
+                run_id=run_id,
+                cross_file_context=""
+            )
+            started = time.perf_counter()
+            error = None
+            with recorder.run(run_id, state["codebase"], state["current_task"]):
+                try:
+                    await graph.ainvoke(state)
+                except Exception as e:
+                    error = repr(e)
+            missing = sum(m.missing for m in models.values())
+            if missing and error is None:
+                # Agents fall back instead of raising, so the run itself "succeeds"
+                error = f"{missing} model calls had no recorded response"
+            results[run_id] = {
+                "duration": time.perf_counter() - started,
+                "recorded_duration": (run["end"] or {}).get("duration"),
+                "unmatched_prompts": sum(m.unmatched for m in models.values()),
+                "unused_responses": sum(len(m.calls) for m in models.values()),
+                "missing_responses": missing,
+                "error": error
+            }
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(replay_one(run_id, run) for run_id, run in replayable.items()))
+    finally:
+        set_tracer(None)
+    wall = time.perf_counter() - started
+
+    recorded_nodes = _node_durations(record for run in replayable.values() for record in run["nodes"])
+    replayed_nodes = _node_durations(recorder.records)
+    nodes = {}
+    for node in sorted(set(recorded_nodes) | set(replayed_nodes)):
+        recorded, replayed = recorded_nodes.get(node, []), replayed_nodes.get(node, [])
+        nodes[node] = {
+            "recorded_avg": round(sum(recorded) / len(recorded), 4) if recorded else None,
+            "replayed_avg": round(sum(replayed) / len(replayed), 4) if replayed else None,
+            "count": len(replayed)
+        }
+
+    return {
+        "runs": len(replayable),
+        "skipped_redacted": len(runs) - len(unredacted),
+        "skipped_no_calls": len(unredacted) - len(replayable),
+        # Replayed runs that needed responses the trace does not have; their timings are not comparable
+        "incomplete": sum(1 for r in results.values() if r["missing_responses"]),
+        "wall_time": round(wall, 3),
+        "runs_per_second": round(len(replayable) / wall, 3) if wall else 0.0,
+        "errors": sum(1 for r in results.values() if r["error"]),
+        "nodes": nodes,
+        "per_run": results
+    }
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded AgentForge runs")
+    parser.add_argument("trace", help="JSON-lines trace written with AGENTFORGE_TRACE_FILE")
+    parser.add_argument("--concurrency", type=int, default=4, help="runs replayed at once")
+    parser.add_argument("--speed", type=float, default=1.0, help="divide recorded latencies (and arrival gaps) by this")
+    parser.add_argument("--arrivals", action="store_true", help="start runs at their recorded offsets")
+    parser.add_argument("--use-cache", action="store_true", help="keep the agent result cache between runs")
+    parser.add_argument("--profile", action="store_true", help="print the top cProfile entries of the replay")
+    parser.add_argument("--per-run", action="store_true", help="include per-run results in the report")
+    args = parser.parse_args(argv)
+
+    runs = load_trace(args.trace)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    report = asyncio.run(replay_runs(runs, args.concurrency, args.speed, args.arrivals, args.use_cache))
+    if profiler:
+        profiler.disable()
+
+    if not args.per_run:
+        report.pop("per_run")
+    print(json.dumps(report, indent=2))
+    if profiler:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+        print(out.getvalue())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Transport package
\ No newline at end of file
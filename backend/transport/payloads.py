@@ -0,0 +1,151 @@
+# backend/transport/payloads.py
+import copy
+import difflib
+import hashlib
+import json
+import os
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # binary encoding is optional
+    msgpack = None
+
+COMPACT_FORMAT = "compact-v1"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Longer texts are sent whole ({"$ref"}): matching cost grows faster than the saving
+DIFF_MAX_LINES = int(os.getenv("AGENTFORGE_DIFF_MAX_LINES", "4000"))
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+def code_diff(base: str, new: str) -> Optional[list]:
+    """Line-level patch from base to new, or None when sending the full text is smaller (or either is too long to diff).
+
+    The patch is a list of ops: ["=", n] keeps n base lines, ["-", n] skips
+    n base lines and ["+", [lines]] inserts new lines.
+    """
+    base_lines = base.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    if max(len(base_lines), len(new_lines)) > DIFF_MAX_LINES:
+        return None
+    patch = []
+    # autojunk stays on: without it, files with many repeated lines (blank, "}") take seconds
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base_lines, new_lines).get_opcodes():
+        if tag == "equal":
+            patch.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            patch.append(["-", i2 - i1])
+        if j2 > j1:
+            patch.append(["+", new_lines[j1:j2]])
+    return patch if len(json.dumps(patch)) < len(new) else None
+
+def apply_diff(base: str, patch: list) -> str:
+    """Rebuild the new text from base and a code_diff patch"""
+    base_lines = base.splitlines(keepends=True)
+    output = []
+    position = 0
+    for op, arg in patch:
+        if op == "=":
+            output.extend(base_lines[position:position + arg])
+            position += arg
+        elif op == "-":
+            position += arg
+        else:
+            output.extend(arg)
+    return "".join(output)
+
+def compact_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Deduplicate a workflow result for the wire.
+
+    Code strings are sent once in `blobs` and referenced as {"$ref": hash};
+    the implementer's rewrite is sent as {"$diff": {"base": hash, "patch": ...}}
+    when that is smaller. `memory_context` is dropped: it only refers to
+    `agent_outputs` and `codebase`. Clients rebuild the full form with
+    `expand_result`.
+    """
+    blobs = {}
+
+    def ref(code: str) -> Dict[str, str]:
+        key = content_hash(code)
+        blobs[key] = code
+        return {"$ref": key}
+
+    codebase = result.get("codebase", "")
+    compact = {
+        key: value for key, value in result.items()
+        if key not in ("codebase", "memory_context", "agent_outputs", "final_result")
+    }
+    compact["codebase"] = ref(codebase)
+
+    agent_outputs = []
+    for entry in result.get("agent_outputs", []):
+        output = entry["output"]
+        improved = output.get("improved_code") if isinstance(output, dict) else None
+        if isinstance(improved, str):
+            output = dict(output)
+            patch = code_diff(codebase, improved) if codebase else None
+            output["improved_code"] = (
+                {"$diff": {"base": compact["codebase"]["$ref"], "patch": patch}} if patch is not None else ref(improved)
+            )
+            entry = dict(entry, output=output)
+        agent_outputs.append(entry)
+    compact["agent_outputs"] = agent_outputs
+
+    # final_result repeats top-level sections (e.g. verification); list those instead of copying them
+    final_result = {}
+    shared = []
+    for key, value in result.get("final_result", {}).items():
+        if key in result and result[key] == value:
+            shared.append(key)
+        else:
+            final_result[key] = value
+    if shared:
+        final_result["$shared"] = shared
+    compact["final_result"] = final_result
+
+    analysis = compact.get("static_analysis")
+    if isinstance(analysis, dict) and "summary" in analysis:
+        # The summary is prompt text derived from the other fields
+        compact["static_analysis"] = {k: v for k, v in analysis.items() if k != "summary"}
+
+    compact["blobs"] = blobs
+    compact["format"] = COMPACT_FORMAT
+    return compact
+
+def expand_result(compact: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of compact_result (minus the dropped memory_context)"""
+    blobs = compact["blobs"]
+
+    def resolve(value: Any) -> Any:
+        if isinstance(value, dict) and "$ref" in value:
+            return blobs[value["$ref"]]
+        if isinstance(value, dict) and "$diff" in value:
+            return apply_diff(blobs[value["$diff"]["base"]], value["$diff"]["patch"])
+        return value
+
+    result = copy.deepcopy({k: v for k, v in compact.items() if k not in ("blobs", "format")})
+    result["codebase"] = resolve(result["codebase"])
+    for entry in result.get("agent_outputs", []):
+        if isinstance(entry["output"], dict) and "improved_code" in entry["output"]:
+            entry["output"]["improved_code"] = resolve(entry["output"]["improved_code"])
+    final_result = result.get("final_result", {})
+    for key in final_result.pop("$shared", []):
+        final_result[key] = result[key]
+    return result
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    return bool(msgpack and accept and MSGPACK_MEDIA_TYPE in accept)
+
+def wants_compact(value: Any) -> bool:
+    """Parse a compact flag from a JSON body (bool) or query string ("1"/"true"); anything else is off"""
+    if isinstance(value, bool):
+        return value
+    return str(value or "").lower() in ("1", "true")
+
+def encode_payload(payload: Dict[str, Any], binary: bool = False) -> Tuple[bytes, str]:
+    """Serialize to (body, media type): msgpack when requested and installed, JSON otherwise"""
+    if binary and msgpack:
+        return msgpack.packb(payload, use_bin_type=True, default=str), MSGPACK_MEDIA_TYPE
+    return json.dumps(payload, separators=(",", ":"), default=str).encode(), "application/json"
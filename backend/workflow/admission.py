@@ -0,0 +1,173 @@
+# backend/workflow/admission.py
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+PRIORITIES = ("high", "normal", "low")
+
+class AdmissionDecision:
+    """What to do with a request: full, reduced, cache, fast or reject"""
+
+    def __init__(self, mode: str, reason: str = "", retry_after: Optional[int] = None):
+        self.mode = mode
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "reason": self.reason}
+
+class AdmissionController:
+    """Bounds concurrent workflow runs and sheds load by priority when saturated.
+
+    The degradation ladder, cheapest last: full workflow, reduced workflow
+    (architect only), cached result, local fast response, and finally 429.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_queue: int = 16, max_queue_wait: float = 10.0,
+                 error_rate_threshold: float = 0.5, error_window: float = 60.0, error_min_calls: int = 20,
+                 fast_per_second: float = 50.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.error_rate_threshold = error_rate_threshold
+        self.error_window = error_window
+        # Below this many calls in the window the rate is noise (one timeout would read as 100%)
+        self.error_min_calls = error_min_calls
+        self.in_flight = 0
+        self.waiting = 0
+        self.avg_queue_wait = 0.0
+        self.avg_run_time = 0.0
+        self._slots = asyncio.Semaphore(max_in_flight)
+        # (timestamp, agent calls, failed calls) per finished run
+        self._outcomes = deque()
+        # Token bucket for the local fast path, the last stop before rejecting
+        self.fast_per_second = fast_per_second
+        self._fast_tokens = fast_per_second
+        self._fast_refilled = time.monotonic()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_in_flight=int(os.getenv("AGENTFORGE_MAX_IN_FLIGHT", "8")),
+            max_queue=int(os.getenv("AGENTFORGE_MAX_QUEUE", "16")),
+            max_queue_wait=float(os.getenv("AGENTFORGE_MAX_QUEUE_WAIT", "10")),
+            error_rate_threshold=float(os.getenv("AGENTFORGE_ERROR_RATE_THRESHOLD", "0.5")),
+            error_min_calls=int(os.getenv("AGENTFORGE_ERROR_MIN_CALLS", "20")),
+            fast_per_second=float(os.getenv("AGENTFORGE_FAST_PER_SECOND", "50")),
+        )
+
+    def _window(self):
+        """(calls, failed calls) recorded within the error window"""
+        cutoff = time.monotonic() - self.error_window
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+        return sum(outcome[1] for outcome in self._outcomes), sum(outcome[2] for outcome in self._outcomes)
+
+    def error_rate(self) -> float:
+        calls, failures = self._window()
+        return failures / calls if calls else 0.0
+
+    def provider_failing(self) -> bool:
+        """Error rate over the threshold, judged only once the window holds error_min_calls calls"""
+        calls, failures = self._window()
+        return calls >= self.error_min_calls and failures / calls > self.error_rate_threshold
+
+    def expected_wait(self) -> float:
+        """Rough queue wait for a new arrival: runs ahead of it divided by parallelism"""
+        if self.in_flight < self.max_in_flight:
+            return 0.0
+        return (self.waiting + 1) / self.max_in_flight * self.avg_run_time
+
+    def _take_fast_token(self) -> bool:
+        now = time.monotonic()
+        self._fast_tokens = min(self.fast_per_second, self._fast_tokens + (now - self._fast_refilled) * self.fast_per_second)
+        self._fast_refilled = now
+        if self._fast_tokens >= 1:
+            self._fast_tokens -= 1
+            return True
+        return False
+
+    def fast_or_reject(self, reason: str) -> AdmissionDecision:
+        """Last two rungs of the ladder: the local fast path while its budget lasts, then 429"""
+        if self._take_fast_token():
+            return AdmissionDecision("fast", reason)
+        retry_after = max(1, math.ceil(self.expected_wait() or 1 / self.fast_per_second))
+        return AdmissionDecision("reject", reason, retry_after)
+
+    def decide(self, priority: str = "normal", cached: bool = False) -> AdmissionDecision:
+        """Choose how to serve a request given current load, provider health and priority"""
+        priority = priority if priority in PRIORITIES else "normal"
+
+        if self.provider_failing():
+            # The provider is failing: most model calls would end in fallbacks anyway
+            if cached:
+                return AdmissionDecision("cache", "provider_errors")
+            if priority == "high" and self.waiting < self.max_queue:
+                return AdmissionDecision("reduced", "provider_errors")
+            return self.fast_or_reject("provider_errors")
+
+        if self.in_flight < self.max_in_flight:
+            return AdmissionDecision("full")
+
+        # All slots busy: admitted requests would queue
+        queue_ok = self.waiting < self.max_queue and self.expected_wait() <= self.max_queue_wait
+        if queue_ok and priority == "high":
+            return AdmissionDecision("full", "queued")
+        if cached:
+            return AdmissionDecision("cache", "saturated")
+        if queue_ok and priority == "normal":
+            return AdmissionDecision("reduced", "saturated")
+        return self.fast_or_reject("saturated")
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait for a run slot; yields False when the wait exceeds max_queue_wait"""
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.max_queue_wait)
+            acquired = True
+        except asyncio.TimeoutError:
+            acquired = False
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.avg_queue_wait = 0.8 * self.avg_queue_wait + 0.2 * waited
+
+        if not acquired:
+            yield False
+            return
+
+        self.in_flight += 1
+        run_started = time.monotonic()
+        try:
+            yield True
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            run_time = time.monotonic() - run_started
+            self.avg_run_time = run_time if not self.avg_run_time else 0.8 * self.avg_run_time + 0.2 * run_time
+
+    def record_outcome(self, agent_outputs: list) -> None:
+        """Feed the provider error rate: fallback outputs are failed model calls"""
+        failures = sum(1 for output in agent_outputs if output.get("fallback"))
+        if agent_outputs:
+            self._outcomes.append((time.monotonic(), len(agent_outputs), failures))
+
+    def record_failure(self) -> None:
+        """A run that raised or timed out counts as one failed call"""
+        self._outcomes.append((time.monotonic(), 1, 1))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "avg_queue_wait": round(self.avg_queue_wait, 3),
+            "avg_run_time": round(self.avg_run_time, 3),
+            "error_rate": round(self.error_rate(), 3),
+            "provider_failing": self.provider_failing()
+        }
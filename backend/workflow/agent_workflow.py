@@ -1,7 +1,18 @@
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Dict, Any
+from typing import TypedDict, Annotated, List, Dict, Any
 import json
+import operator
 from agents.code_agents import ArchitectAgent, ImplementationAgent, TestingAgent, SecurityAgent
+from agents.model_router import ModelRouter
+from agents.prompts import shared_context
+from analysis.static_analyzer import analyze_code
+from analysis.fingerprint import fingerprint
+from execution.sandbox import SandboxRunner
+from memory.result_cache import ResultCache
+from tracing.recorder import get_tracer
+from transport.payloads import content_hash
+import asyncio
+import time
 import google.generativeai as genai
 import os
 
@@ -9,37 +20,148 @@ import os
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 model = genai.GenerativeModel('gemini-2.5-flash')
 
+# Agent outputs keyed by the exact code the agent saw, shared by all workflows in the process
+agent_cache = ResultCache(int(os.getenv("AGENTFORGE_AGENT_CACHE_SIZE", "256")))
+
+# Speculative pipelining of implementer -> tester/security:
+#   off      - run the agents one after another
+#   stream   - start reviews as soon as the streamed improved_code is complete
+#   original - start reviews on the original code while the implementer runs
+SPECULATIVE_MODE = os.getenv("AGENTFORGE_SPECULATIVE_MODE", "off").lower()
+
+# Execute generated tests in the sandbox so reported complexity/performance is measured.
+# Off by default: it runs model-written code, and only does so under bubblewrap
+# or AGENTFORGE_SANDBOX_COMMAND isolation (see execution/sandbox.py)
+SANDBOX_ENABLED = os.getenv("AGENTFORGE_SANDBOX_ENABLED", "false").lower() == "true"
+
+def merge_results(current: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    return {**current, **update}
+
 class AgentForgeState(TypedDict):
+    # Nodes return only the keys they change; these two accumulate across nodes
     codebase: str
     current_task: str
-    agent_outputs: List[Dict[str, Any]]
+    agent_outputs: Annotated[List[Dict[str, Any]], operator.add]
     memory_context: Dict[str, Any]
     improvement_suggestions: List[str]
-    final_result: Dict[str, Any]
+    final_result: Annotated[Dict[str, Any], merge_results]
+    static_analysis: Dict[str, Any]
+    verification: Dict[str, Any]
+    run_id: str
+    cross_file_context: str
+
+def improved_code_of(state: AgentForgeState) -> str:
+    """The implementer's rewrite of the code, or the original when there is none"""
+    for entry in reversed(state["agent_outputs"]):
+        if entry["agent"] == "implementer":
+            return entry["output"].get("improved_code", state["codebase"])
+    return state["codebase"]
+
+def checkpoint_key(state: AgentForgeState) -> str:
+    """Checkpointer key of a run: its run ID scoped to a hash of everything the nodes read.
+
+    A run ID resumed with different code, task or cross-file context gets
+    its own checkpoints rather than reading (or clearing) another run's.
+    """
+    inputs = "\0".join((state["codebase"], state.get("current_task", ""), state.get("cross_file_context", "")))
+    return f"{state['run_id']}:{content_hash(inputs)}"
+
+AGENT_NAMES = ("architect", "implementer", "tester", "security")
+
+class MissingModel:
+    """Model for agents left out of models=: injected runs must never fall back to the provider"""
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self.model_name = None
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        raise RuntimeError(f"No model injected for {self.agent}")
 
-def create_agent_forge_workflow():
-    # Initialize agents
-    architect = ArchitectAgent(model)
-    implementer = ImplementationAgent(model)
-    tester = TestingAgent(model)
-    security = SecurityAgent(model)
+def create_agent_forge_workflow(checkpointer=None, agent_set: str = "full", models: Dict[str, Any] = None):
+    """Build the graph; agent_set="reduced" runs only the architect (used to degrade under load).
+
+    models maps agent names (architect, implementer, tester, security) to
+    model objects and disables routing; trace replay uses it to inject
+    recorded responses. Agents missing from it fail their calls rather
+    than using the live model.
+    """
+    # Initialize agents; the router picks a model tier per call
+    if models is None and os.getenv("AGENTFORGE_MODEL_ROUTING", "true").lower() == "true":
+        router = ModelRouter()
+    else:
+        router = None
+    if models is None:
+        models = {name: model for name in AGENT_NAMES}
+    models = {name: models.get(name) or MissingModel(name) for name in AGENT_NAMES}
+    architect = ArchitectAgent(models["architect"], router)
+    implementer = ImplementationAgent(models["implementer"], router)
+    tester = TestingAgent(models["tester"], router)
+    security = SecurityAgent(models["security"], router)
+    sandbox = SandboxRunner(
+        timeout=float(os.getenv("AGENTFORGE_SANDBOX_TIMEOUT", "10")),
+        memory_limit_mb=int(os.getenv("AGENTFORGE_SANDBOX_MEMORY_MB", "512"))
+    )
+    
+    def agent_input(state: AgentForgeState, **fields) -> Dict[str, Any]:
+        # Every agent of a run shares one prompt prefix built from the original code
+        facts = state.get("static_analysis", {}).get("summary", "")
+        cross_file = state.get("cross_file_context", "")
+        if cross_file:
+            # Repository mode: signatures from other modules, never their full source
+            facts += f"\n\nSignatures this module uses from other files of the repository:\n{cross_file}"
+            fields["cross_file_context"] = cross_file
+        fields.update({
+            "facts": facts,
+            "complexity": state.get("static_analysis", {}).get("cyclomatic", 0),
+            "context": shared_context(state["codebase"], facts)
+        })
+        return fields
+    
+    async def cached_process(agent, key_parts: tuple, input_data: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        # Keyed on the raw text (and the shared prefix, which holds the original code), not the
+        # fingerprint: outputs can quote comments and the implementer's rewrite carries them,
+        # so they must never reach a different submission
+        prefix = getattr(input_data.get("context"), "digest", "")
+        key = (agent.name, content_hash(input_data.get("code", "")), prefix) + key_parts + (input_data.get("cross_file_context", ""),)
+        result = agent_cache.get(key)
+        if result is None:
+            result = await agent.process(input_data, **kwargs)
+            agent_cache.set(key, result)
+        # Shared, not copied: nodes return new entries and never mutate agent outputs
+        return result
     
     # Define agent functions
-    async def architect_node(state: AgentForgeState) -> AgentForgeState:
+    async def analysis_node(state: AgentForgeState) -> Dict[str, Any]:
+        # Local static analysis: no model call (reuse it if the caller already ran it)
+        analysis = state.get("static_analysis") or analyze_code(state["codebase"])
+        if "fingerprint" not in analysis:
+            analysis = dict(analysis, fingerprint=fingerprint(state["codebase"], analysis["language"]))
+        update = {"static_analysis": analysis}
+        if analysis["verdict"] == "reject":
+            update["final_result"] = {
+                "rejected": True,
+                "reason": analysis["reason"],
+                "static_analysis": analysis
+            }
+        return update
+    
+    async def architect_node(state: AgentForgeState) -> Dict[str, Any]:
         try:
-            result = await architect.process({
-                "code": state["codebase"],
-                "requirements": state["current_task"]
-            })
+            result = await cached_process(
+                architect,
+                (state["current_task"],),
+                agent_input(state, code=state["codebase"], requirements=state["current_task"])
+            )
             
-            state["agent_outputs"].append({
+            entry = {
                 "agent": "architect",
                 "output": result,
                 "timestamp": "2025-01-20T10:00:00Z"
-            })
+            }
         except Exception as e:
             # Fallback response
-            state["agent_outputs"].append({
+            entry = {
                 "agent": "architect",
                 "output": {
                     "analysis": "Code analysis completed",
@@ -48,29 +170,32 @@ def create_agent_forge_workflow():
                     "performance": ["Optimize loops"],
                     "security": ["Add input validation"]
                 },
-                "timestamp": "2025-01-20T10:00:00Z"
-            })
+                "timestamp": "2025-01-20T10:00:00Z",
+                "fallback": True
+            }
         
-        return state
+        return {"agent_outputs": [entry]}
     
-    async def implementer_node(state: AgentForgeState) -> AgentForgeState:
+    async def implementer_entry(state: AgentForgeState, on_code=None) -> Dict[str, Any]:
         try:
             # Get suggestions from architect
             suggestions = state["agent_outputs"][-1]["output"].get("improvements", ["Improve code"])
             
-            result = await implementer.process({
-                "code": state["codebase"],
-                "suggestions": suggestions
-            })
+            result = await cached_process(
+                implementer,
+                (json.dumps(suggestions, sort_keys=True, default=str),),
+                agent_input(state, code=state["codebase"], suggestions=suggestions),
+                on_code=on_code
+            )
             
-            state["agent_outputs"].append({
+            return {
                 "agent": "implementer",
                 "output": result,
                 "timestamp": "2025-01-20T10:00:00Z"
-            })
+            }
         except Exception as e:
             # Fallback response
-            state["agent_outputs"].append({
+            return {
                 "agent": "implementer",
                 "output": {
                     "improved_code": state["codebase"] + "\n// Improved with better practices",
@@ -78,28 +203,22 @@ def create_agent_forge_workflow():
                     "tests": ["// Unit tests added"],
                     "benchmarks": ["Performance improved"]
                 },
-                "timestamp": "2025-01-20T10:00:00Z"
-            })
-        
-        return state
+                "timestamp": "2025-01-20T10:00:00Z",
+                "fallback": True
+            }
     
-    async def tester_node(state: AgentForgeState) -> AgentForgeState:
+    async def tester_entry(state: AgentForgeState, improved_code: str) -> Dict[str, Any]:
         try:
-            # Get improved code from implementer
-            improved_code = state["agent_outputs"][-1]["output"].get("improved_code", state["codebase"])
-            
-            result = await tester.process({
-                "code": improved_code
-            })
+            result = await cached_process(tester, (), agent_input(state, code=improved_code))
             
-            state["agent_outputs"].append({
+            return {
                 "agent": "tester",
                 "output": result,
                 "timestamp": "2025-01-20T10:00:00Z"
-            })
+            }
         except Exception as e:
             # Fallback response
-            state["agent_outputs"].append({
+            return {
                 "agent": "tester",
                 "output": {
                     "unit_tests": ["// Unit tests created"],
@@ -108,28 +227,22 @@ def create_agent_forge_workflow():
                     "performance_tests": ["// Performance tests"],
                     "coverage": "95% test coverage"
                 },
-                "timestamp": "2025-01-20T10:00:00Z"
-            })
-        
-        return state
+                "timestamp": "2025-01-20T10:00:00Z",
+                "fallback": True
+            }
     
-    async def security_node(state: AgentForgeState) -> AgentForgeState:
+    async def security_entry(state: AgentForgeState, final_code: str) -> Dict[str, Any]:
         try:
-            # Get final code from tester
-            final_code = state["agent_outputs"][-1]["output"].get("improved_code", state["codebase"])
-            
-            result = await security.process({
-                "code": final_code
-            })
+            result = await cached_process(security, (), agent_input(state, code=final_code))
             
-            state["agent_outputs"].append({
+            return {
                 "agent": "security",
                 "output": result,
                 "timestamp": "2025-01-20T10:00:00Z"
-            })
+            }
         except Exception as e:
             # Fallback response
-            state["agent_outputs"].append({
+            return {
                 "agent": "security",
                 "output": {
                     "vulnerabilities": ["No critical vulnerabilities found"],
@@ -138,47 +251,192 @@ def create_agent_forge_workflow():
                     "best_practices": ["Security best practices applied"],
                     "compliance": "Compliant with standards"
                 },
-                "timestamp": "2025-01-20T10:00:00Z"
-            })
+                "timestamp": "2025-01-20T10:00:00Z",
+                "fallback": True
+            }
+    
+    async def implementer_node(state: AgentForgeState) -> Dict[str, Any]:
+        return {"agent_outputs": [await implementer_entry(state)]}
+    
+    async def tester_node(state: AgentForgeState) -> Dict[str, Any]:
+        # Test the implementer's improved code
+        return {"agent_outputs": [await tester_entry(state, improved_code_of(state))]}
+    
+    async def pipeline_node(state: AgentForgeState) -> Dict[str, Any]:
+        # Speculative implementer -> (tester, security): reviews start before the implementer finishes
+        reviews = {}  # fingerprint -> task running tester and security on that code
+        finished = False
+        
+        def start_reviews(code: str):
+            # The streaming thread can still report code after the node finished or was cancelled
+            if finished:
+                return
+            key = fingerprint(code)
+            if key not in reviews:
+                reviews[key] = asyncio.ensure_future(asyncio.gather(
+                    tester_entry(state, code), security_entry(state, code)
+                ))
+        
+        def cancel(task):
+            if not task.done():
+                task.cancel()
+                # Mark the cancellation as handled so asyncio doesn't log it as unretrieved
+                task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        
+        try:
+            if SPECULATIVE_MODE == "original":
+                # Bet that the implementer keeps the code materially the same
+                start_reviews(state["codebase"])
+            on_code = start_reviews if SPECULATIVE_MODE == "stream" else None
+            
+            implementation = await implementer_entry(state, on_code=on_code)
+            final_code = implementation["output"].get("improved_code", state["codebase"])
+            
+            # Keep the review of the final code (started early or now); cancel wrong guesses
+            final_key = fingerprint(final_code)
+            reused = final_key in reviews
+            start_reviews(final_code)
+            for key, task in reviews.items():
+                if key != final_key:
+                    cancel(task)
+            tester_output, security_output = await reviews[final_key]
+        finally:
+            # Also reached when the run times out and cancels this node mid-review
+            finished = True
+            for task in reviews.values():
+                cancel(task)
+        
+        return {
+            "agent_outputs": [implementation, tester_output, security_output],
+            "final_result": {"speculation": {
+                "mode": SPECULATIVE_MODE,
+                "reviews_started": len(reviews),
+                "speculative_review_reused": reused
+            }}
+        }
+    
+    async def verification_node(state: AgentForgeState) -> Dict[str, Any]:
+        outputs = {entry["agent"]: entry["output"] for entry in state["agent_outputs"]}
+        implementation = outputs.get("implementer", {})
+        tests = outputs.get("tester", {})
+        language = state.get("static_analysis", {}).get("language")
+        
+        if not SANDBOX_ENABLED:
+            verification = {"status": "disabled"}
+        elif language != "python":
+            verification = {"status": "unsupported", "reason": f"Sandbox runs Python only (got {language})"}
+        else:
+            try:
+                verification = await sandbox.verify(
+                    implementation.get("improved_code", state["codebase"]),
+                    tests.get("unit_tests"),
+                    tests.get("performance_tests")
+                )
+            except Exception as e:
+                verification = {"status": "error", "error": str(e)}
+            # Keep the claims next to the measurements so clients can compare them
+            verification["claimed"] = {
+                "implementer": implementation.get("complexity_analysis"),
+                "tester": tests.get("complexity_verification")
+            }
         
-        return state
+        return {"verification": verification, "final_result": {"verification": verification}}
     
-    async def memory_node(state: AgentForgeState) -> AgentForgeState:
-        # Store all agent outputs in memory
-        state["memory_context"] = {
-            "agent_outputs": state["agent_outputs"],
+    async def security_node(state: AgentForgeState) -> Dict[str, Any]:
+        # Audit the implementer's final code
+        return {"agent_outputs": [await security_entry(state, improved_code_of(state))]}
+    
+    async def memory_node(state: AgentForgeState) -> Dict[str, Any]:
+        # agent_outputs are already in the state; list the agents instead of copying them.
+        # The codebase is the state's own string (shared, not copied), so every response can resolve it
+        return {"memory_context": {
             "codebase": state["codebase"],
+            "agents": [entry["agent"] for entry in state["agent_outputs"]],
             "task": state["current_task"]
-        }
-        return state
+        }}
+    
+    def after_analysis(state: AgentForgeState) -> str:
+        if state["static_analysis"]["verdict"] == "reject":
+            return "reject"
+        return "proceed"
     
     def should_continue(state: AgentForgeState) -> str:
         # Check if we need another iteration
-        if len(state["agent_outputs"]) < 4:
+        if agent_set == "full" and len(state["agent_outputs"]) < 4:
             return "continue"
         return "finish"
     
+    def checkpointed(name: str, node):
+        # Skip nodes this run already completed; save each clean node's update
+        async def run(state: AgentForgeState) -> Dict[str, Any]:
+            if checkpointer is None or not state.get("run_id"):
+                return await traced(name, node, state)
+            
+            key = checkpoint_key(state)
+            saved = checkpointer.get(key, name)
+            if saved is not None:
+                tracer = get_tracer()
+                if tracer is not None:
+                    tracer.record_node(name, 0.0, saved["update"], skipped=True)
+                # Replaying the saved update rebuilds the same state through the reducers
+                return saved["update"]
+            
+            update = await traced(name, node, state)
+            # A fallback output is not real progress; leave it and everything after it to the retry
+            outputs = state["agent_outputs"] + update.get("agent_outputs", [])
+            if not any(entry.get("fallback") for entry in outputs):
+                checkpointer.save(key, name, {"update": update})
+            return update
+        return run
+    
+    async def traced(name: str, node, state: AgentForgeState) -> Dict[str, Any]:
+        tracer = get_tracer()
+        if tracer is None:
+            return await node(state)
+        started = time.perf_counter()
+        update = await node(state)
+        tracer.record_node(name, time.perf_counter() - started, update)
+        return update
+    
     # Create workflow
     workflow = StateGraph(AgentForgeState)
     
     # Add nodes
-    workflow.add_node("architect", architect_node)
-    workflow.add_node("implementer", implementer_node)
-    workflow.add_node("tester", tester_node)
-    workflow.add_node("security", security_node)
-    workflow.add_node("memory", memory_node)
+    workflow.add_node("analysis", checkpointed("analysis", analysis_node))
+    workflow.add_node("architect", checkpointed("architect", architect_node))
+    if agent_set == "full" and SPECULATIVE_MODE == "off":
+        workflow.add_node("implementer", checkpointed("implementer", implementer_node))
+        workflow.add_node("tester", checkpointed("tester", tester_node))
+        workflow.add_node("verify", checkpointed("verify", verification_node))
+        workflow.add_node("security", checkpointed("security", security_node))
+    elif agent_set == "full":
+        workflow.add_node("pipeline", checkpointed("pipeline", pipeline_node))
+        workflow.add_node("verify", checkpointed("verify", verification_node))
+    workflow.add_node("memory", checkpointed("memory", memory_node))
     
     # Add edges
-    workflow.add_edge("architect", "implementer")
-    workflow.add_edge("implementer", "tester")
-    workflow.add_edge("tester", "security")
-    workflow.add_edge("security", "memory")
+    workflow.add_conditional_edges("analysis", after_analysis, {
+        "proceed": "architect",
+        "reject": END
+    })
+    if agent_set == "reduced":
+        workflow.add_edge("architect", "memory")
+    elif SPECULATIVE_MODE == "off":
+        workflow.add_edge("architect", "implementer")
+        workflow.add_edge("implementer", "tester")
+        workflow.add_edge("tester", "verify")
+        workflow.add_edge("verify", "security")
+        workflow.add_edge("security", "memory")
+    else:
+        workflow.add_edge("architect", "pipeline")
+        workflow.add_edge("pipeline", "verify")
+        workflow.add_edge("verify", "memory")
     workflow.add_conditional_edges("memory", should_continue, {
         "continue": "architect",
         "finish": END
     })
     
     # Set entry point
-    workflow.set_entry_point("architect")
+    workflow.set_entry_point("analysis")
     
     return workflow.compile() 
\ No newline at end of file
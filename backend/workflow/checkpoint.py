@@ -0,0 +1,95 @@
+# backend/workflow/checkpoint.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+class InMemoryCheckpointer:
+    """Keeps the state update of each completed node, per run ID, in process memory"""
+
+    def __init__(self, max_runs: int = 256):
+        self.max_runs = max_runs
+        self.runs: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, run_id: str, node: str) -> Optional[Dict[str, Any]]:
+        # Nodes never mutate their inputs, so the saved update can be handed out as is
+        return self.runs.get(run_id, {}).get(node)
+
+    def save(self, run_id: str, node: str, update: Dict[str, Any]) -> None:
+        # Round-trip through JSON so memory and SQLite checkpoints hold the same values
+        self.runs.setdefault(run_id, {})[node] = json.loads(json.dumps(update, default=str))
+        self.runs.move_to_end(run_id)
+        while len(self.runs) > self.max_runs:
+            self.runs.popitem(last=False)
+
+    def completed_nodes(self, run_id: str) -> list:
+        return list(self.runs.get(run_id, {}))
+
+    def clear(self, run_id: str) -> None:
+        self.runs.pop(run_id, None)
+
+class SQLiteCheckpointer:
+    """Checkpoints in a SQLite file so a restarted worker can resume runs"""
+
+    def __init__(self, path: str = "checkpoints.db", max_age_seconds: int = 24 * 3600):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                run_id TEXT NOT NULL,
+                node TEXT NOT NULL,
+                state TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (run_id, node)
+            )
+        """)
+        self._conn.commit()
+        self.prune()
+
+    def get(self, run_id: str, node: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM checkpoints WHERE run_id = ? AND node = ?", (run_id, node)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, run_id: str, node: str, update: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, node, state, created_at) VALUES (?, ?, ?, ?)",
+                (run_id, node, json.dumps(update, default=str), time.time())
+            )
+            self._conn.commit()
+
+    def completed_nodes(self, run_id: str) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT node FROM checkpoints WHERE run_id = ? ORDER BY created_at", (run_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def clear(self, run_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            self._conn.commit()
+
+    def prune(self) -> None:
+        """Drop checkpoints older than max_age_seconds"""
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+            self._conn.commit()
+
+def create_checkpointer():
+    """Build the checkpointer selected by AGENTFORGE_CHECKPOINTER (memory, sqlite or none)"""
+    kind = os.getenv("AGENTFORGE_CHECKPOINTER", "memory").lower()
+    if kind == "sqlite":
+        return SQLiteCheckpointer(os.getenv("AGENTFORGE_CHECKPOINT_DB", "checkpoints.db"))
+    if kind == "memory":
+        return InMemoryCheckpointer()
+    return None